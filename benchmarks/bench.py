@@ -0,0 +1,287 @@
+from code import client
+from code import fetch
+from code import indicators
+from code import output
+from code import providers
+from code import store
+from contextlib import contextmanager, redirect_stdout
+import pandas as pd
+import numpy as np
+import subprocess
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import json
+import time
+import sys
+import io
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Benchmark suite (run from the repository root).
+
+    python -m benchmarks.bench                      default sizes, results in benchmarks/results/
+    python -m benchmarks.bench --sizes 10M-minute   one size, up to 10M minute bars
+    python -m benchmarks.bench --compare OLD.json NEW.json
+
+Every size is a synthetic, seeded random walk per source, so runs on different
+commits time exactly the same input. Each case is timed `repeat` times (best
+and median wall time are kept), then run once more under tracemalloc for its
+peak memory. The fetch case merges the recorded CoinDesk / Nomics responses
+in benchmarks/fixtures through fetch.update, with the network left out.
+
+The startup cases time main.py in a fresh interpreter, as cron runs it: --help
+and an offline --all --no-charts run over one year of daily bars. Their peak
+memory is the child's resident set size, and each has a budget in seconds;
+--startup runs only these and exits non-zero when one is over budget.
+'''
+
+SIZES = {
+    '1y-daily': (365, 'D'),
+    '10y-daily': (3650, 'D'),
+    '1y-hourly': (8760, 'h'),
+    '1y-minute': (525600, 'min'),
+    '10M-minute': (10_000_000, 'min'),
+}
+DEFAULT_SIZES = ['1y-daily', '10y-daily', '1y-hourly', '1y-minute']
+SOURCES = ['coindesk', 'nomics']
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+THRESHOLD = 1.10 # --compare flags a case at least 10% slower
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+STARTUP = {
+    'startup_help': ['--help'],
+    'startup_offline': ['--all', '--offline', '--no-charts'],
+}
+STARTUP_BUDGET = {'startup_help': 0.25, 'startup_offline': 1.0} # seconds, best of repeat
+
+def synthetic(rows, freq='D', sources=SOURCES, seed=0):
+
+    """
+    Seeded geometric random walk, one column per source.
+    Inputs:
+        - rows = number of bars
+        - freq = pandas frequency of the bars ('D', 'h', 'min')
+        - sources = column names; each source deviates slightly from the first
+    Outputs:
+        - Pandas DataFrame with a date column and one price column per source
+    """
+
+    rng = np.random.default_rng(seed)
+    scale = {'D': 0.03, 'h': 0.006, 'min': 0.0008}[freq]
+    base = 7000*np.exp(np.cumsum(rng.normal(0, scale, rows)))
+    df = pd.DataFrame({'date': pd.date_range('2020-01-01', periods=rows, freq=freq)})
+    for i, s in enumerate(sources):
+        df[s] = base if i == 0 else base*(1 + rng.normal(0, 0.002, rows))
+    if freq == 'D':
+        df['date'] = df['date'].dt.date
+    return df
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, f'{name}.json')) as f:
+        return json.load(f)
+
+@contextmanager
+def recorded(bodies):
+    # serve remote requests from recorded bodies instead of the network
+    fetch_all = client.fetch_all
+    client.fetch_all = lambda requests: {name: bodies[name] for name in requests}
+    try:
+        yield
+    finally:
+        client.fetch_all = fetch_all
+
+@contextmanager
+def workdir():
+    # indicator('all') reads the store and writes score.csv relative to the cwd
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, 'docs', 'assets', 'data'))
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+def measure(fn, repeat=3):
+
+    """
+    Outputs:
+        - dict of best / median wall time (seconds) over repeat runs and
+        the peak traced memory (MB) of one further run
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    with redirect_stdout(io.StringIO()):
+        fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'best': min(times), 'median': float(np.median(times)), 'peak_mb': round(peak/2**20, 2)}
+
+# Runs main.py as `python main.py ...` would, then reports the process' own
+# peak resident memory (VmHWM; ru_maxrss would include the forked parent's)
+CHILD = """import atexit, runpy, sys, os
+def peak():
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            sys.stderr.write(''.join(l for l in f if l.startswith('VmHWM')))
+atexit.register(peak)
+sys.argv = sys.argv[1:]
+sys.path[0] = os.path.dirname(sys.argv[0])
+runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+def spawn(args, cwd=None):
+    # wall time (seconds) and peak resident memory (MB, 0 where unknown) of main.py in a new interpreter
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', CHILD, MAIN, *args], cwd=cwd,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError(f"main.py {' '.join(args)} failed:\n{proc.stderr}")
+    peak = [line.split()[1] for line in proc.stderr.splitlines() if line.startswith('VmHWM')]
+    return elapsed, int(peak[0])/1024 if peak else 0.0
+
+def startup(repeat=3):
+
+    """
+    Cold-start cases, see STARTUP.
+    Outputs:
+        - list of result dicts: case, size, rows, best, median, peak_mb, budget
+    """
+
+    results = []
+    rows, freq = SIZES['1y-daily']
+    with workdir() as tmp:
+        store.save(synthetic(rows, freq).set_index('date'))
+        for case, args in STARTUP.items():
+            spawn(args, tmp) # warm the file cache, as a cron job that runs daily would find it
+            runs = [spawn(args, tmp) for _ in range(repeat)]
+            times = [t for t, _ in runs]
+            r = {'case': case, 'size': 'cold', 'rows': 0 if case == 'startup_help' else rows,
+                 'best': min(times), 'median': float(np.median(times)),
+                 'peak_mb': round(max(p for _, p in runs), 2), 'budget': STARTUP_BUDGET[case]}
+            results.append(r)
+            flag = '  OVER BUDGET' if r['best'] > r['budget'] else ''
+            print(f"{case:<16} {'cold':<11} {r['rows']:>10} rows  best {r['best']:.4f}s  median {r['median']:.4f}s  "
+                  f"peak {r['peak_mb']} MB  budget {r['budget']}s{flag}")
+    return results
+
+def over_budget(results):
+    return [r['case'] for r in results if 'budget' in r and r['best'] > r['budget']]
+
+def cases(df, columns):
+    return {
+        'macd': lambda: indicators.macd(df, columns, charts=False),
+        'rsi': lambda: indicators.rsi(df, columns, 14, charts=False),
+        'bollinger_band': lambda: indicators.bollinger_band(df, columns, 20, 2, charts=False),
+        'ichimoku_cloud': lambda: indicators.ichimoku_cloud(df, columns, 9, 26, 52, 26, charts=False),
+    }
+
+def run(sizes=DEFAULT_SIZES, repeat=3):
+
+    """
+    Run every case at every size.
+    Outputs:
+        - list of result dicts: case, size, rows, best, median, peak_mb
+    """
+
+    results = startup(repeat)
+
+    def record(case, size, rows, fn):
+        r = {'case': case, 'size': size, 'rows': rows, **measure(fn, repeat)}
+        results.append(r)
+        print(f"{case:<16} {size:<11} {rows:>10} rows  best {r['best']:.4f}s  median {r['median']:.4f}s  peak {r['peak_mb']} MB")
+
+    sources = [providers.REGISTRY[name](name) for name in SOURCES]
+    bodies = {name: fixture(name) for name in SOURCES}
+    with recorded(bodies):
+        days = len(fetch.update(None, sources))
+        record('fetch_merge', 'fixtures', days, lambda: fetch.update(None, sources))
+
+    for size in sizes:
+        rows, freq = SIZES[size]
+        df = synthetic(rows, freq)
+        for case, fn in cases(df, SOURCES).items():
+            record(case, size, rows, fn)
+
+        with workdir():
+            store.save(df.set_index('date'))
+            record('indicator_all', size, rows, lambda: output.indicator('all', offline=True, charts=False))
+        del df
+
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit or 'unknown', 'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+def save(results, path=None):
+    env = environment()
+    path = path or os.path.join(RESULTS_DIR, f"{env['commit']}.json")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'environment': env, 'results': results}, f, indent=1)
+    return path
+
+def compare(old_path, new_path, threshold=THRESHOLD):
+
+    """
+    Print the best-time ratio new / old of every case both files share.
+    Outputs:
+        - list of (case, size) at least `threshold` times slower
+    """
+
+    with open(old_path) as f:
+        old = {(r['case'], r['size']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {(r['case'], r['size']): r for r in json.load(f)['results']}
+
+    slower = []
+    for k in [k for k in new if k in old]:
+        ratio = new[k]['best']/old[k]['best'] if old[k]['best'] else float('inf')
+        mem = new[k]['peak_mb']/old[k]['peak_mb'] if old[k]['peak_mb'] else float('inf')
+        flag = ''
+        if ratio >= threshold:
+            slower.append(k)
+            flag = '  REGRESSION'
+        print(f'{k[0]:<16} {k[1]:<11} time x{ratio:.2f}  memory x{mem:.2f}{flag}')
+    return slower
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the indicators, fetch merge and full scoring')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=DEFAULT_SIZES, help='Synthetic input sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (3 by default)')
+    parser.add_argument('--out', metavar='FILE', help='Results file (benchmarks/results/<commit>.json by default)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two results files and exit')
+    parser.add_argument('--startup', action='store_true', help='Only time cold starts, exit non-zero if one is over budget')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+    if args.startup:
+        sys.exit(1 if over_budget(startup(args.repeat)) else 0)
+    print(f'Results written to {save(run(args.sizes, args.repeat), args.out)}')
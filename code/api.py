@@ -0,0 +1,227 @@
+from code import backtest
+from code import engine
+from code import fetch
+from code import providers
+from code import rules
+from code import store
+from concurrent.futures import Future
+from collections import OrderedDict
+from dataclasses import fields, asdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+import threading
+import hashlib
+import json
+import math
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Local HTTP / JSON scoring API (python main.py --api).
+
+    GET /score                      composite score, components, support / resistance
+    GET /score?rsi_period=21&rsi=0.2   any engine.Params period or per-indicator weight
+    GET /health                     data version, row count and cache statistics
+
+Prices come from the local store, re-read only when the store file changes
+(keep it fresh with --serve or a cron job). Responses are memoized per
+(data version, parameters) in an LRU cache, and concurrent requests for the
+same key wait for one computation instead of starting their own.
+'''
+
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_SIZE = 128
+
+PARAMS = {f.name: f.type for f in fields(engine.Params)}
+
+class ScoreCache:
+
+    """
+    LRU memo with request coalescing: the first caller of a missing key
+    computes it, callers arriving meanwhile wait on the same Future.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except Exception as e:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            del self.pending[key]
+        future.set_result(value)
+        return value
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced}
+
+class Prices:
+    # The complete price frame and its version, reloaded when the store file changes
+
+    def __init__(self, path=store.STORE_PATH):
+        self.path = path
+        self.sources = providers.configured()
+        self.columns = providers.names(self.sources)
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.data = None
+        self.version = None
+
+    def _stamp(self):
+        for path in (self.path, os.path.splitext(self.path)[0] + '.pkl'):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                return path, stat.st_mtime_ns, stat.st_size
+        return None
+
+    def current(self):
+        with self.lock:
+            stamp = self._stamp()
+            if stamp is None:
+                raise FileNotFoundError(f'No local price store at {self.path}')
+            if stamp != self.stamp:
+                self.data = fetch.complete(store.load(self.path), self.sources).reset_index()
+                self.version = hashlib.sha1(pd.util.hash_pandas_object(self.data, index=False).to_numpy().tobytes()).hexdigest()[:16]
+                self.stamp = stamp
+            return self.data, self.version
+
+def _number(x):
+    x = float(x)
+    return None if math.isnan(x) else x
+
+def evaluate(data, columns, params, weights, rule_set=None):
+
+    """
+    Score the latest date and explain it (by rule_set, the current rules by default).
+    Outputs:
+        - dict with the composite score, quote, each indicator's inputs and
+        weighted contribution, Bollinger band touches and Ichimoku support /
+        resistance levels
+    """
+
+    prices = engine.matrix(data, columns)
+    res = engine.compute(prices, params, engine.hlc(data, columns))
+    rule_set = rule_set or rules.load()
+    terms = backtest.score_history(res, prices, weights=weights, rule_set=rule_set)
+    i = res.ichimoku
+    touches = res.bollinger.touches
+
+    score = float(terms['score'][-1])
+    return {
+        'date': str(data['date'].iloc[-1]),
+        'score': score,
+        'quote': rule_set.quote(score),
+        'components': {
+            'macd': {'uptrend': res.macd.uptrend, 'crossover': res.macd.latest_crossover,
+                     'score': round(float(terms['macd'][-1])*100, 1)},
+            'rsi': {'overbought': rule_set.rsi_zone(res.rsi.latest), 'rsi': _number(res.rsi.latest),
+                    'score': round(float(terms['rsi'][-1])*100, 1)},
+            'bollinger': {'bounce': res.bollinger.bounce, 'squeeze': res.bollinger.squeeze,
+                          # times the price left the band over the last period, through either side
+                          'touches': {'lower': touches.count_since(-params.bollinger_period, 1),
+                                      'upper': touches.count_since(-params.bollinger_period, -1)},
+                          'score': round(float(terms['bollinger'][-1])*100, 1)},
+            'ichimoku': {'kijun_trend': i.kijun_trend, 'chikou_trend': i.chikou_trend,
+                         'support': [_number(v) for v in i.support],
+                         'resistance': [_number(v) for v in i.resistance],
+                         'score': round(float(terms['ichimoku'][-1])*100, 1)},
+        },
+        'params': asdict(params),
+        'weights': weights,
+    }
+
+def parse_query(query, rule_set=None):
+    # ?rsi_period=21&macd=0.2 -> (Params, weights); unknown keys are an error
+    args = {k: v[-1] for k, v in parse_qs(query).items()}
+    unknown = set(args) - set(PARAMS) - set(backtest.TERMS)
+    if unknown:
+        raise ValueError(f'Unknown parameters: {sorted(unknown)}')
+    params = engine.Params(**{k: (float(v) if PARAMS[k] in (float, 'float') else int(v))
+                              for k, v in args.items() if k in PARAMS})
+    # terms not in the query keep the weights of the scoring rules
+    weights = {**(rule_set or rules.load()).weights['all'], **{t: float(args[t]) for t in backtest.TERMS if t in args}}
+    return params, weights
+
+class Handler(BaseHTTPRequestHandler):
+    prices = None
+    cache = None
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == '/health':
+                data, version = self.prices.current()
+                return self._send(200, {'version': version, 'rows': len(data), 'cache': self.cache.stats()})
+            if url.path == '/score':
+                rule_set = rules.load()
+                params, weights = parse_query(url.query, rule_set)
+                data, version = self.prices.current()
+                # the same prices and parameters score differently once the rules change
+                key = (version, rule_set.digest, tuple(asdict(params).values()), tuple(weights.values()))
+                body = self.cache.get(key, lambda: evaluate(data, self.prices.columns, params, weights, rule_set))
+                return self._send(200, {'version': version, **body})
+            self._send(404, {'error': f'Unknown path {url.path}'})
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+        except FileNotFoundError as e:
+            self._send(503, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+def server(host=HOST, port=PORT, path=store.STORE_PATH, cache_size=CACHE_SIZE):
+    handler = type('ScoreHandler', (Handler,), {'prices': Prices(path), 'cache': ScoreCache(cache_size)})
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve(host=HOST, port=PORT):
+    httpd = server(host, port)
+    print(f'Scoring API on http://{host}:{port}/score')
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        httpd.server_close()
@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+import tempfile
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Atomic file replacement.
+
+Every file the project rewrites in place (the price store, the columnar
+mirror, snapshots, caches, stats) goes through write(): the content lands in
+a private temporary file in the same directory, which is renamed over the
+target only once it is complete. A crash leaves the old file, and runs that
+overlap (a cron job next to --serve) each write their own temporary file, so
+one run can never rename the other's half-written one into place.
+'''
+
+@contextmanager
+def write(path, mode='w', **kwargs):
+
+    """
+    Inputs:
+        - path = file to replace
+        - mode = 'w' (text) or 'wb' (binary); kwargs go to open (e.g. newline='')
+    Outputs:
+        - open file object; path is replaced when the with block ends without
+        an error, and the temporary file removed otherwise
+    """
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.chmod(tmp, 0o644) # mkstemp creates 0600; keep the usual permissions of the target
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
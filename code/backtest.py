@@ -0,0 +1,139 @@
+from code import engine
+from code import rules
+import pandas as pd
+import numpy as np
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Vectorized backtest of the composite score.
+
+output.indicator scores the last row only. Here the scoring rules (see
+code.rules) are evaluated on every date at once, so their buy / hold / sell
+thresholds can be checked against the whole history in one pass.
+'''
+
+BUY, HOLD, SELL = 1, 0, -1
+TERMS = rules.TERMS
+
+def score_history(res, prices, max_score=None, weights=None, rule_set=None):
+
+    """
+    Composite score for every date.
+    Inputs:
+        - res = engine.Indicators computed on prices
+        - prices = NumPy array (dates, sources) the indicators were computed on
+        - max_score = weight of every term instead of the rules' (1 gives the
+        unweighted terms, which the sweep then weighs itself)
+        - weights = optional per-indicator override, e.g. {'rsi': 1/6}
+        - rule_set = rules.RuleSet (rules.load() by default)
+    Outputs:
+        - dict of per-date arrays: one entry per indicator plus the rounded
+        composite 'score' on the -100..100 scale of process_score
+    """
+
+    rule_set = rule_set or rules.load()
+    w = dict(rule_set.weights['all'])
+    if max_score is not None:
+        w = dict.fromkeys(w, max_score)
+    w.update(weights or {})
+    return rule_set.terms(rules.history(res, prices), 'all', w)
+
+def weigh(units, weights, rows=slice(None), rule_set=None):
+
+    """
+    Composite score of unit-weight terms under other weights.
+    Inputs:
+        - units = score_history(..., max_score=1) of one indicator pass
+        - weights = dict of term to weight
+        - rows = rows to score (all by default)
+        - rule_set = rules.RuleSet (rules.load() by default)
+    Outputs:
+        - rounded score per row, as score_history would give with these weights
+    """
+
+    rule_set = rule_set or rules.load()
+    return rule_set.combine({t: units[t][rows] for t in weights}, weights)['score']
+
+def signals(score, rule_set=None):
+    """BUY below buy_below, SELL from sell_from up, HOLD in between (-40 / 40 by default)"""
+    rule_set = rule_set or rules.load()
+    return np.where(score < rule_set.buy_below, BUY, np.where(score >= rule_set.sell_from, SELL, HOLD))
+
+def simulate(close, signal, fee=0.0):
+
+    """
+    Long / flat simulation of a signal series.
+    Inputs:
+        - close = price per date
+        - signal = BUY / HOLD / SELL per date (see signals())
+        - fee = proportional cost per position change
+    Outputs:
+        - dict of per-date arrays: position, strategy log-returns, equity curve
+    Notes:
+        - BUY opens (or keeps) a long position, SELL closes it, HOLD keeps
+        whatever position there was. A signal on date t is traded at the close
+        of t, so it earns the return from t to t+1; nothing looks ahead.
+    """
+
+    target = np.where(signal == BUY, 1.0, np.where(signal == SELL, 0.0, np.nan))
+    position = pd.Series(target).ffill().fillna(0).to_numpy()
+
+    held = np.concatenate([[0.0], position[:-1]])
+    log_ret = np.diff(np.log(close), prepend=np.nan)
+    log_ret[0] = 0.0
+    costs = np.abs(np.diff(position, prepend=0.0))*np.log1p(-fee) if fee else 0.0
+
+    strategy = held*np.nan_to_num(log_ret) + costs
+    equity = np.exp(np.cumsum(strategy))
+
+    return dict(position=position, held=held, log_return=log_ret, strategy=strategy, equity=equity)
+
+def metrics(sim):
+    equity, held = sim['equity'], sim['held']
+    drawdown = equity/np.maximum.accumulate(equity) - 1
+
+    # each run of held bars is one trade; a hit is a trade that made money
+    entries = (held == 1) & (np.concatenate([[0.0], held[:-1]]) == 0)
+    trade = np.cumsum(entries)
+    in_trade = held == 1
+    trade_returns = np.bincount(trade[in_trade], weights=sim['strategy'][in_trade])[1:] if in_trade.any() else np.array([])
+
+    return {
+        'total_return': float(equity[-1] - 1),
+        'buy_and_hold': float(np.exp(np.nansum(sim['log_return'])) - 1),
+        'max_drawdown': float(drawdown.min()),
+        'trades': int(entries.sum()),
+        'hit_rate': float((trade_returns > 0).mean()) if len(trade_returns) else float('nan'),
+        'exposure': float(held.mean()),
+    }
+
+def run(data, columns, params=None, max_score=None, fee=0.0):
+
+    """
+    Backtest the composite score over the full history.
+    Inputs:
+        - data = Pandas DataFrame with date and price columns
+        - columns = Column names that contain BTC-USD values
+        - params = engine.Params (periods)
+    Outputs: (history, report)
+        - history = Pandas DataFrame of per-date terms, score, signal and equity
+        - report = dict of total return, buy-and-hold return, max drawdown,
+        trade count, hit rate and exposure
+    """
+
+    prices = engine.matrix(data, columns)
+    res = engine.compute(prices, params, engine.hlc(data, columns))
+    terms = score_history(res, prices, max_score)
+    signal = signals(terms['score'])
+    sim = simulate(res.ichimoku.close, signal, fee)
+
+    history = pd.DataFrame({'date': np.asarray(data['date']), 'close': res.ichimoku.close,
+                            **terms, 'signal': signal, 'position': sim['position'],
+                            'equity': sim['equity']})
+    return history, metrics(sim)
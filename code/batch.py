@@ -0,0 +1,133 @@
+from code import atomic
+from code import engine
+from code import fetch
+from code import providers
+from code import rules
+from code import store
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+import numpy as np
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Multi-asset batch scoring.
+
+Every symbol of a watchlist is loaded (each from its own local store), its
+source columns are laid side by side in one (rows, columns) matrix, and the
+engine computes every indicator for all symbols at once, column-wise. Long
+watchlists are split into shards scored in separate processes. The result is
+one table with a row per symbol.
+'''
+
+SCORES_PATH = 'docs/assets/data/scores.csv'
+SHARD_SIZE = 250
+LOADERS = 8 # symbols downloaded at the same time
+
+def store_path(symbol):
+    # BTC keeps the store the single-asset commands use
+    if symbol == 'BTC':
+        return store.STORE_PATH
+    root, ext = os.path.splitext(store.STORE_PATH)
+    return f'{root}-{symbol}{ext}'
+
+def _load(symbol, offline):
+    sources = providers.for_symbol(symbol)
+    if not sources:
+        raise ValueError(f'No configured source serves {symbol}')
+    df = fetch.live_data(offline, store_path(symbol), sources)
+    return df.set_index('date')[providers.names(sources)]
+
+def load(symbols, offline=False):
+
+    """
+    Load the price history of every symbol into one matrix.
+    Outputs: (prices, groups, last)
+        - prices = NumPy array (rows, columns), each symbol's sources in a
+        contiguous block; histories are aligned on their latest row (shorter
+        ones padded with NaN at the top), so the last row of every block is
+        that symbol's latest price and its indicators come out exactly as
+        when it is scored alone
+        - groups = symbol of each column
+        - last = dict of symbol to the date of its latest row
+    """
+
+    frames = {}
+    with ThreadPoolExecutor(LOADERS) as pool:
+        futures = {s: pool.submit(_load, s, offline) for s in symbols}
+    for s, future in futures.items():
+        try:
+            frames[s] = future.result()
+        except Exception as e:
+            print(f'Skipping {s}: {e!r}')
+
+    if not frames:
+        raise RuntimeError('No symbol could be loaded')
+
+    rows = max(len(f) for f in frames.values())
+    prices = np.full((rows, sum(f.shape[1] for f in frames.values())), np.nan)
+    groups = []
+    for s, f in frames.items():
+        prices[rows-len(f):, len(groups):len(groups)+f.shape[1]] = f.to_numpy(dtype='float64')
+        groups += [s]*f.shape[1]
+
+    return prices, np.array(groups), {s: f.index.max() for s, f in frames.items()}
+
+def score(res, rule_set=None):
+
+    """
+    Composite score of every asset, the scoring rules applied to all assets at once.
+    Inputs:
+        - res = engine.Indicators computed with groups (one value per asset)
+    Outputs:
+        - dict of per-asset arrays: each indicator's share of the score and
+        the 'score' itself, both in percent and rounded as in code.history
+    """
+
+    terms = (rule_set or rules.load()).terms(rules.latest(res), 'all')
+    return {t: v if t == 'score' else np.round(v*100, 1) for t, v in terms.items()}
+
+def score_shard(symbols, offline=False, params=None):
+    prices, groups, last = load(symbols, offline)
+    res = engine.compute(prices, params, groups=groups)
+    names = list(dict.fromkeys(groups))
+
+    table = pd.DataFrame({'symbol': names, 'date': [last[s] for s in names], **score(res)})
+    table['rsi_value'] = res.rsi.latest
+    table['support'] = [str([round(float(v), 2) for v in s]) for s in res.ichimoku.support]
+    table['resistance'] = [str([round(float(v), 2) for v in r]) for r in res.ichimoku.resistance]
+    return table
+
+def run(symbols, offline=False, params=None, shard_size=SHARD_SIZE, workers=None):
+
+    """
+    Score a whole watchlist.
+    Inputs:
+        - symbols = list of asset symbols, e.g. ['BTC', 'ETH']
+        - offline = True/False read the local stores only
+        - shard_size = symbols per shard; more shards are scored in parallel processes
+    Outputs:
+        - Pandas DataFrame, one row per symbol
+    """
+
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    shards = [symbols[i:i+shard_size] for i in range(0, len(symbols), shard_size)]
+
+    if len(shards) == 1:
+        tables = [score_shard(shards[0], offline, params)]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            tables = list(pool.map(score_shard, shards, [offline]*len(shards), [params]*len(shards)))
+
+    return pd.concat(tables, ignore_index=True)
+
+def save(table, path=SCORES_PATH):
+    # one consolidated table, replaced atomically
+    with atomic.write(path, newline='') as f:
+        table.to_csv(f, index=False)
@@ -0,0 +1,151 @@
+from code import atomic
+from code import profiling
+import aiohttp
+import asyncio
+import json
+import time
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Concurrent JSON fetching.
+
+All requests of one fetch_all() call go out at the same time over a single
+pooled aiohttp session. Each request has its own timeout and retries with
+exponential backoff, but only on failures a retry can fix (timeouts, lost
+connections, 5xx answers). A per-source circuit breaker stops hammering a
+source that keeps failing; its state is kept in BREAKER_PATH, so it carries
+over from one cron run to the next as well as between --serve refreshes.
+Failures come back as exceptions in the result instead of being raised, so
+callers can carry on with whatever answered.
+'''
+
+TIMEOUT = 20 # seconds per attempt
+RETRIES = 3
+BACKOFF = 0.5 # seconds, doubled after every failed attempt
+BREAKER_PATH = 'data/breakers.json'
+
+class CircuitOpen(Exception):
+    pass
+
+class CircuitBreaker:
+
+    """
+    Closed: requests pass. After `failures` consecutive failures the circuit
+    opens and requests fail fast for `reset_after` seconds, then one trial
+    request is let through (half-open); success closes it again. Times are
+    wall clock, so the state still holds when another process reads it.
+    """
+
+    def __init__(self, failures=3, reset_after=300, count=0, opened=None):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.count = count
+        self.opened = opened
+
+    def allow(self):
+        if self.opened is None:
+            return True
+        return time.time() - self.opened >= self.reset_after
+
+    def half_open(self):
+        return self.opened is not None and self.allow()
+
+    def success(self):
+        self.count = 0
+        self.opened = None
+
+    def failure(self):
+        self.count += 1
+        if self.count >= self.failures:
+            self.opened = time.time()
+
+BREAKERS = {}
+
+def breaker(name):
+    if name not in BREAKERS:
+        BREAKERS[name] = CircuitBreaker()
+    return BREAKERS[name]
+
+def load_breakers(path=BREAKER_PATH):
+    """Bring BREAKERS up to date with the state other runs left in path"""
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except ValueError:
+            return
+        for name, state in saved.items():
+            breaker(name).count, breaker(name).opened = state['count'], state['opened']
+
+def save_breakers(path=BREAKER_PATH):
+    if path:
+        with atomic.write(path) as f:
+            json.dump({name: {'count': b.count, 'opened': b.opened} for name, b in BREAKERS.items()}, f, indent=1)
+
+def retryable(e):
+    # a timeout, a lost connection or a server error may pass on the next attempt; a 4xx will not
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status >= 500
+    return isinstance(e, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+async def get_json(session, url, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    for attempt in range(retries + 1):
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == retries or not retryable(e):
+                raise
+            await asyncio.sleep(backoff * 2**attempt)
+
+async def _fetch(session, name, request):
+    request = dict(request)
+    key = request.pop('breaker', name)
+    b = breaker(key)
+    if not b.allow():
+        return CircuitOpen(f'{key} failed {b.count} times in a row, skipped for now')
+    if b.half_open():
+        request = {**request, 'retries': 0} # the trial request is a single attempt
+    try:
+        with profiling.span(f'fetch.{name}'):
+            result = await get_json(session, **request)
+    except Exception as e:
+        b.failure()
+        return e
+    b.success()
+    return result
+
+async def gather(requests, limit=10):
+    connector = aiohttp.TCPConnector(limit=limit)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(*[_fetch(session, name, r) for name, r in requests.items()])
+    return dict(zip(requests, results))
+
+def fetch_all(requests, limit=10, breakers=BREAKER_PATH):
+
+    """
+    Fetch several JSON documents concurrently.
+    Inputs:
+        - requests = dict of source name to dict(url=..., and optionally
+        timeout=..., retries=..., backoff=..., breaker=... the name of the
+        circuit breaker it counts against, the source name by default)
+        - limit = maximum number of pooled connections
+        - breakers = file the circuit breaker state is read from and saved
+        to (None keeps it in this process only)
+    Outputs:
+        - dict of source name to parsed JSON, or to the exception it failed with
+    """
+
+    load_breakers(breakers)
+    try:
+        return asyncio.run(gather(requests, limit))
+    finally:
+        save_breakers(breakers)
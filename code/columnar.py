@@ -0,0 +1,118 @@
+from code import atomic
+import pandas as pd
+import numpy as np
+import json
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Memory-mapped columnar price file.
+
+One file: a short JSON header, the int64 epoch timestamps (ns), then every
+price column as one contiguous float64 block (a column-major matrix). load()
+maps it with numpy.memmap, so opening even a decade of minute bars reads
+nothing up front, and every column or run of neighbouring columns is a view
+of the mapping rather than a copy. Pages are shared between processes that
+map the same file, which is how sweep workers share one read-only history.
+'''
+
+MAGIC = b'BTCCOLS1'
+ALIGN = 64 # data starts on a 64-byte boundary
+
+class Columns:
+
+    """
+    A mapped price file; reads like the price frames the rest of the code uses.
+    Usage:
+        - cols['coindesk'] = column view, cols['date'] = datetime64 view
+        - cols.matrix(['coindesk', 'nomics']) = (rows, columns) view
+        - cols.frame() = Pandas DataFrame copy, when one is really needed
+    """
+
+    def __init__(self, path, times, prices, columns):
+        self.path = path
+        self.times = times
+        self.prices = prices
+        self.columns = list(columns)
+        self._position = {c: i for i, c in enumerate(self.columns)}
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, name):
+        if name == 'date':
+            return self.times.view('datetime64[ns]')
+        return self.prices[:, self._position[name]]
+
+    def matrix(self, columns=None):
+        """Price matrix of columns; a view when they sit next to each other in the file"""
+        if columns is None:
+            return self.prices
+        positions = [self._position[c] for c in columns]
+        first = positions[0]
+        if positions == list(range(first, first + len(positions))):
+            return self.prices[:, first:first + len(positions)]
+        return self.prices[:, positions]
+
+    def frame(self):
+        df = pd.DataFrame(np.asarray(self.prices), columns=self.columns)
+        df.insert(0, 'date', self['date'])
+        return df
+
+def _times(df):
+    # epoch nanoseconds from a date / time column or index
+    when = df['date'] if 'date' in df.columns else df.index.to_series()
+    return pd.DatetimeIndex(pd.to_datetime(when)).as_unit('ns').asi8
+
+def write(df, path, columns=None):
+
+    """
+    Inputs:
+        - df = Pandas DataFrame with a date column, or indexed by date
+        - path = file to write (replaced atomically)
+        - columns = price columns to keep (all numeric columns by default)
+    """
+
+    columns = columns or [c for c in df.columns if c != 'date' and pd.api.types.is_numeric_dtype(df[c])]
+    times = _times(df)
+    header = json.dumps({'rows': len(df), 'columns': columns}).encode()
+    offset = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    with atomic.write(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header.ljust(offset - len(MAGIC) - 8))
+        f.write(np.ascontiguousarray(times, dtype='<i8').tobytes())
+        # column-major: each column is contiguous on disk
+        f.write(np.asfortranarray(df[columns].to_numpy(dtype='<f8')).tobytes(order='F'))
+
+def load(path, mode='r'):
+
+    """
+    Map a columnar file.
+    Outputs:
+        - Columns backed by read-only memmaps (mode='r'), or None if there is no file
+    """
+
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a columnar price file')
+        size = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        header = json.loads(f.read(size))
+    offset = -(-(len(MAGIC) + 8 + size) // ALIGN) * ALIGN
+
+    rows, columns = header['rows'], header['columns']
+    if rows == 0:
+        return Columns(path, np.zeros(0, dtype='<i8'), np.zeros((0, len(columns))), columns)
+    times = np.memmap(path, dtype='<i8', mode=mode, offset=offset, shape=(rows,))
+    prices = np.memmap(path, dtype='<f8', mode=mode, offset=offset + 8*rows,
+                       shape=(rows, len(columns)), order='F')
+    return Columns(path, times, prices, columns)
@@ -0,0 +1,183 @@
+from code import atomic
+from code import engine
+from code import fetch
+from code import output
+from code import providers
+from code import rules
+from code import store
+from code import streaming
+from collections import deque
+from contextlib import contextmanager
+import pandas as pd
+import numpy as np
+import hashlib
+import copy
+import json
+import time
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Long-running scoring daemon (python main.py --serve).
+
+Modules are imported once, the merged price frame stays in memory, and the
+indicators are kept warm as code.streaming state, seeded from one batch pass
+of code.engine: a refresh downloads only the new dates and feeds only the new
+rows. score.csv and the charts are written only when the scored data actually
+changed, and the charts reuse the batch pass of that refresh. Every cycle's stage timings are
+printed and kept in data/daemon-stats.json.
+'''
+
+INTERVAL = 3600 # seconds between refreshes
+STATS_PATH = 'data/daemon-stats.json'
+STATS_KEEP = 100 # cycles kept in the stats file
+
+class Timer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] = round(time.perf_counter() - start, 4)
+
+class Daemon:
+
+    """
+    Inputs:
+        - offline = True/False never download, re-read the local store instead
+        - charts = True/False re-render charts when the data changes
+        - path = location of the local price store
+    """
+
+    def __init__(self, offline=False, charts=True, path=store.STORE_PATH, stats_path=STATS_PATH):
+        self.offline = offline
+        self.charts = charts
+        self.path = path
+        self.stats_path = stats_path
+        self.sources = providers.configured()
+        self.columns = providers.names(self.sources)
+
+        self.stored = store.load(path)
+        self.state = None # streaming state fed with every row but the last
+        self.fed = np.empty((0, len(self.columns)))
+        self.version = None
+        self.digest = None # rules the last score was made with
+        self.score = None
+        self.cycles = deque(maxlen=STATS_KEEP)
+
+    def _advance(self, data):
+        # The last row may still change (partial day), so the warm state stops
+        # one row short and a copy of it takes the last row for scoring. A new
+        # state, or one rebuilt because an older row changed (a filled gap), is
+        # seeded from a batch pass instead of being fed the history row by row;
+        # the charts need that pass anyway, so with charts it runs every time.
+        prices = engine.matrix(data, self.columns)
+        ohlc = any(f'{c}_high' in data.columns for c in self.columns)
+        hlc = engine.hlc(data, self.columns) if ohlc else None
+
+        n = len(self.fed)
+        rebuild = self.state is None or n >= len(prices) or not np.array_equal(prices[:n], self.fed, equal_nan=True)
+        res = engine.compute(prices, hlc=hlc) if rebuild or self.charts else None
+        if rebuild:
+            self.state = streaming.seed(self.columns, prices, res, hlc, len(prices) - 1)
+            n = 0
+        else:
+            self.state.extend(prices[n:-1], None if hlc is None else [a[n:-1] for a in hlc])
+        self.fed = prices[:-1]
+
+        scoring = copy.deepcopy(self.state)
+        scoring.update(prices[-1], None if hlc is None else tuple(a[-1] for a in hlc))
+        return scoring.summary(), len(prices) - 1 - n, prices, res
+
+    def refresh(self):
+
+        """
+        One cycle: top up the prices, score the new rows, publish if changed.
+        Outputs:
+            - dict of timing stats for this cycle
+        """
+
+        t = Timer()
+        start = time.perf_counter()
+
+        with t('fetch'):
+            merged = store.load(self.path) if self.offline else fetch.update(self.stored, self.sources)
+        stored_changed = self.stored is None or not merged.equals(self.stored)
+        if stored_changed and not self.offline:
+            with t('store'):
+                store.save(merged, self.path)
+        self.stored = merged
+
+        data = fetch.complete(merged, self.sources).reset_index()
+        version = hashlib.sha1(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes()).hexdigest()
+        rule_set = rules.load()
+        changed = version != self.version or rule_set.digest != self.digest
+        new_rows = 0
+
+        if changed:
+            with t('indicators'):
+                summary, new_rows, prices, res = self._advance(data)
+
+            with t('score'):
+                values = {**output.process_macd(*summary['macd']),
+                          **output.process_rsi(*summary['rsi']),
+                          **output.process_bollinger(*summary['bollinger']),
+                          **output.process_ichimoku(summary['ichimoku'])}
+                terms = rule_set.terms(values, 'all')
+                self.score = float(terms['score'])
+                print(self.score, data['date'].iloc[-1])
+
+            with t('publish'):
+                output.publish_score(self.score, data['date'].iloc[-1], terms)
+
+            if self.charts:
+                with t('charts'):
+                    from code import render
+                    render.render(render.charts(data['date'], self.columns, prices, res))
+
+            self.version, self.digest = version, rule_set.digest
+
+        cycle = {'at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'rows': len(data), 'new_rows': new_rows,
+                 'changed': changed, 'score': self.score, 'stages': t.stages,
+                 'total': round(time.perf_counter() - start, 4)}
+        self.cycles.append(cycle)
+        self.save_stats()
+        return cycle
+
+    def stats(self):
+        totals = [c['total'] for c in self.cycles]
+        return {'cycles': len(totals), 'mean_total': float(np.mean(totals)) if totals else None,
+                'max_total': max(totals) if totals else None, 'last': list(self.cycles)}
+
+    def save_stats(self):
+        with atomic.write(self.stats_path) as f:
+            json.dump(self.stats(), f, indent=1, default=str)
+
+def serve(interval=INTERVAL, offline=False, charts=True):
+
+    """
+    Refresh every `interval` seconds until interrupted.
+    """
+
+    daemon = Daemon(offline, charts)
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                cycle = daemon.refresh()
+                stages = ', '.join(f'{k} {v:.3f}s' for k, v in cycle['stages'].items())
+                print(f"[{cycle['at']}] {'updated' if cycle['changed'] else 'unchanged'} in {cycle['total']:.3f}s ({stages})")
+            except Exception as e:
+                print(f'Refresh failed: {e!r}')
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print(f"Stopped after {daemon.stats()['cycles']} cycles")
@@ -0,0 +1,419 @@
+from code import events
+import pandas as pd
+import numpy as np
+from dataclasses import dataclass, field
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Vectorized indicator engine.
+
+Every indicator works on one price matrix of shape (dates, sources) and runs
+its rolling / exponential windows over all sources at once. Nothing here
+touches a DataFrame passed in by the caller; results come back as plain
+NumPy arrays wrapped in small dataclasses.
+'''
+
+SQUEEZE_WINDOW = 20 # days of band width looked at for a Bollinger squeeze
+AGGREGATIONS = ['mean', 'median', 'weighted'] # how sources are combined into one consensus
+RELIABILITY_WINDOW = 90 # rows of returns a source's reliability is judged on
+
+@dataclass
+class Params:
+    macd_fast: int = 12
+    macd_slow: int = 26
+    macd_signal: int = 9
+    rsi_period: int = 14
+    bollinger_period: int = 20
+    bollinger_mul: float = 2
+    tenkan: int = 9
+    kijun: int = 26
+    senkou: int = 52
+    chikou: int = 26
+
+@dataclass
+class MACD:
+    macd: np.ndarray        # (dates, sources)
+    signal: np.ndarray      # (dates, sources)
+    crossover: np.ndarray   # (dates,) -1 bearish, 0, 1 bullish, agreed by all sources
+    uptrend: int            # 1 (uptrending), -1 (downtrending), 0 (unclear)
+    latest_crossover: int   # most recent non-zero crossover
+    events: object = None   # events.EventIndex of crossover (a list of them per asset)
+
+@dataclass
+class RSI:
+    rsi: np.ndarray         # (dates, sources)
+    consensus: np.ndarray   # (dates,) mean over sources
+    latest: float           # overbought / oversold is a scoring rule, see code.rules
+
+@dataclass
+class Bollinger:
+    ma: np.ndarray          # (dates, sources)
+    upper: np.ndarray       # (dates, sources)
+    lower: np.ndarray       # (dates, sources)
+    bounce: int             # 1 (bouncing up), -1 (bouncing down), 0 (unclear)
+    squeeze: int            # 1 (contracting), -1 (widening), 0 (unclear)
+    touches: object = None  # events.EventIndex: 1 price crossed below the lower band, -1 above the upper
+
+@dataclass
+class Ichimoku:
+    close: np.ndarray       # (dates,)
+    tenkan: np.ndarray
+    kijun: np.ndarray
+    senkou_a: np.ndarray
+    senkou_b: np.ndarray
+    chikou: np.ndarray
+    kijun_crossover: np.ndarray
+    chikou_crossover: np.ndarray
+    support: list
+    resistance: list
+    kijun_trend: int
+    chikou_trend: int
+    kijun_events: object = None   # events.EventIndex of kijun_crossover
+    chikou_events: object = None  # events.EventIndex of chikou_crossover
+
+@dataclass
+class Indicators:
+    macd: MACD
+    rsi: RSI
+    bollinger: Bollinger
+    ichimoku: Ichimoku
+    params: Params = field(default_factory=Params)
+    layout: object = None   # Layout the sources were combined with
+
+
+# Rolling primitives. Windows run along axis 0 over every column at once; the
+# arithmetic is pandas' own, so results match the DataFrame code bit for bit.
+
+def _frame(a):
+    return pd.DataFrame(a) if a.ndim == 2 else pd.Series(a)
+
+def ewm(a, span):
+    return _frame(a).ewm(span=span, adjust=False).mean().to_numpy()
+
+def rolling_mean(a, n):
+    return _frame(a).rolling(n).mean().to_numpy()
+
+def rolling_std(a, n):
+    return _frame(a).rolling(n).std().to_numpy()
+
+def rolling_max(a, n):
+    return _frame(a).rolling(n).max().to_numpy()
+
+def rolling_min(a, n):
+    return _frame(a).rolling(n).min().to_numpy()
+
+def shift(a, k):
+    out = np.full(a.shape, np.nan)
+    if k < len(a):
+        out[k:] = a[:len(a)-k]
+    return out
+
+def crossover(a, b):
+    """1 where a crosses above b, -1 where it crosses below, 0 elsewhere"""
+    # the previous row is a slice, not a shifted copy; NaN compares False either way
+    out = np.zeros(np.broadcast(a, b).shape, dtype='int')
+    out[1:] = ((a > b)[1:] & (a <= b)[:-1]).astype('int') - ((a < b)[1:] & (a >= b)[:-1])
+    return out
+
+def latest_event(index):
+    # most recent non-zero event of an events.index() result, 0 if there is none
+    if isinstance(index, list):
+        return np.array([i.latest_kind() for i in index], dtype='int')
+    return index.latest_kind()
+
+def _sign(x):
+    if x > 0:
+        return 1
+    elif x < 0:
+        return -1
+    return 0
+
+def _signs(x):
+    return np.sign(np.nan_to_num(x)).astype('int')
+
+
+# Assets. The price matrix may hold several assets side by side, each with its
+# own block of contiguous source columns; per-asset consensus combines the
+# block (a mean unless the layout asks for a median or weights). With a single
+# asset every summary comes back as a scalar (and every consensus series as
+# 1-D), exactly as the one-asset code always did.
+
+@dataclass
+class Layout:
+    starts: np.ndarray      # first source column of each asset
+    counts: np.ndarray      # number of source columns of each asset
+    single: bool = True
+    how: str = 'mean'       # one of AGGREGATIONS
+    weights: np.ndarray = None # per column, for how='weighted'
+
+    @property
+    def last(self):
+        return self.starts + self.counts - 1
+
+def layout(n_columns, groups=None, how='mean', weights=None):
+
+    """
+    Inputs:
+        - n_columns = number of price columns
+        - groups = asset label of each column (columns of an asset contiguous),
+        None for a single asset
+        - how = 'mean', 'median' or 'weighted' consensus of each asset's sources
+        - weights = per column weight for 'weighted' (see reliability())
+    """
+
+    if how not in AGGREGATIONS:
+        raise ValueError(f'Unknown aggregation {how!r}, use one of {AGGREGATIONS}')
+    if how == 'weighted' and weights is None:
+        raise ValueError('Weighted aggregation needs weights')
+    if weights is not None:
+        weights = np.asarray(weights, dtype='float64')
+
+    if groups is None:
+        return Layout(np.array([0]), np.array([n_columns]), True, how, weights)
+    groups = np.asarray(groups)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    if len(starts) != len(set(groups.tolist())):
+        raise ValueError('Columns of one asset must be next to each other')
+    return Layout(starts, np.diff(np.r_[starts, len(groups)]), False, how, weights)
+
+def group_mean(a, lay):
+    """(dates, columns) -> (dates, assets) mean over each asset's sources"""
+    return np.add.reduceat(a, lay.starts, axis=-1) / lay.counts
+
+def aggregate(a, lay):
+    """(dates, columns) -> (dates, assets) consensus of each asset's sources, as lay.how says"""
+    if lay.how == 'mean' or (lay.counts == 1).all():
+        return group_mean(a, lay)
+    if lay.how == 'weighted':
+        return np.add.reduceat(a * lay.weights, lay.starts, axis=-1) / np.add.reduceat(lay.weights, lay.starts)
+    return np.stack([np.median(a[..., s:s+c], axis=-1) for s, c in zip(lay.starts, lay.counts)], axis=-1)
+
+def tracking_error(prices, lay=None, window=RELIABILITY_WINDOW):
+    """RMS gap between each source's returns and its asset's median returns over the last `window` rows"""
+    lay = lay or layout(prices.shape[1])
+    asset = np.repeat(np.arange(len(lay.starts)), lay.counts)
+    median = Layout(lay.starts, lay.counts, lay.single, 'median')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(prices[-window-1:]), axis=0)
+        squared = (returns - aggregate(returns, median)[:, asset])**2
+        return np.sqrt(np.nansum(squared, axis=0) / (~np.isnan(squared)).sum(axis=0))
+
+def reliability(prices, lay=None, window=RELIABILITY_WINDOW):
+
+    """
+    Weight of each source: the inverse of its tracking_error(), normalised to
+    sum to 1 per asset. A source that tracks the others closely counts more
+    (with only two sources the median is their mean, so both weigh the same).
+    """
+
+    lay = lay or layout(prices.shape[1])
+    asset = np.repeat(np.arange(len(lay.starts)), lay.counts)
+    error = tracking_error(prices, lay, window)
+
+    # a source with no usable history weighs as much as the least reliable one
+    known = np.isfinite(error)
+    error = np.where(known, error, error[known].max() if known.any() else 1.0)
+    weights = 1/np.maximum(error, 1e-12)
+    return weights / np.add.reduceat(weights, lay.starts)[asset]
+
+def diagnostics(prices, res):
+
+    """
+    Each source's own reading, next to the consensus it was folded into.
+    Inputs:
+        - prices = NumPy array (dates, sources) res was computed on
+        - res = Indicators from compute()
+    Outputs:
+        - dict of (sources,) arrays: latest price and its deviation from the
+        consensus price, MACD trend and latest crossover, RSI, Bollinger
+        bounce, missing rows, tracking error and weight in the consensus
+    """
+
+    lay = res.layout or layout(prices.shape[1])
+    asset = np.repeat(np.arange(len(lay.starts)), lay.counts)
+    m, b = res.macd, res.bollinger
+    price = prices[-1]
+    near = 0.3*np.abs(price - b.ma[-1])
+
+    if lay.how == 'weighted':
+        weight = lay.weights / np.add.reduceat(lay.weights, lay.starts)[asset]
+    elif lay.how == 'mean':
+        weight = (1/lay.counts)[asset]
+    else:
+        weight = np.full(len(price), np.nan) # a median has no fixed weights
+
+    return dict(
+        price=price,
+        deviation=price/aggregate(price, lay)[asset] - 1,
+        macd_trend=_signs(m.macd[-1]),
+        macd_crossover=latest_event(events.index(crossover(m.macd, m.signal))),
+        rsi=res.rsi.rsi[-1],
+        bollinger_bounce=np.where(np.abs(price - b.upper[-1]) <= near, -1,
+                                  np.where(np.abs(price - b.lower[-1]) <= near, 1, 0)),
+        missing=np.isnan(prices).sum(axis=0),
+        tracking_error=tracking_error(prices, lay),
+        weight=weight,
+    )
+
+def _out(x, lay):
+    # one asset: drop the asset axis, and turn 0-d results into Python scalars
+    if not lay.single:
+        return x
+    x = np.asarray(x)[..., 0]
+    return x.item() if x.ndim == 0 else x
+
+
+def matrix(df, columns):
+    """(dates, sources) float matrix of the given price columns"""
+    if hasattr(df, 'matrix'):
+        # code.columnar file: a view of the mapping, no copy
+        return df.matrix(columns)
+    return df[columns].to_numpy(dtype='float64')
+
+def macd(prices, fast=12, slow=26, signal_span=9, lay=None):
+    return macd_from_line(ewm(prices, fast) - ewm(prices, slow), signal_span, lay)
+
+def macd_from_line(macd, signal_span=9, lay=None):
+    lay = lay or layout(macd.shape[1])
+    signal = ewm(macd, signal_span)
+
+    # the consensus of the sources' crossovers, truncated to a whole event: with
+    # the mean (or weights) every source has to agree, with the median most of them
+    cross = _out(np.trunc(aggregate(crossover(macd, signal), lay)).astype('int'), lay)
+    index = events.index(cross)
+
+    return MACD(macd, signal, cross, _out(_signs(macd[-1, lay.last]), lay), latest_event(index), index)
+
+def rsi(prices, n=14, lay=None):
+    lay = lay or layout(prices.shape[1])
+    moving = np.diff(prices, axis=0, prepend=np.nan)
+    gain = np.clip(moving, 0, None)
+    loss = np.clip(-moving, 0, None)
+
+    aver_gain = np.abs(rolling_mean(gain, n))
+    aver_loss = np.abs(rolling_mean(loss, n))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = aver_gain/aver_loss
+        rsi = rolling_mean(100 - (100 / (1 + rs)), 3)
+
+    consensus = aggregate(rsi, lay)
+    return RSI(rsi, _out(consensus, lay), _out(consensus[-1], lay))
+
+def bollinger_band(prices, n=20, mul=2, lay=None):
+    ma = rolling_mean(prices, n) # Simple MA
+    stdevs = rolling_std(prices, n) # Standard deviations
+    return bollinger_from_stats(prices, ma, stdevs, mul, lay)
+
+def bollinger_from_stats(prices, ma, stdevs, mul=2, lay=None):
+    lay = lay or layout(prices.shape[1])
+    upper = ma + mul * stdevs
+    lower = ma - mul * stdevs
+
+    # first source's price against the bands averaged over sources
+    price = prices[:, lay.starts]
+    band_upper, band_lower = aggregate(upper, lay), aggregate(lower, lay)
+    band_ma = aggregate(ma[-1], lay)
+    near = 0.3*np.abs(price[-1] - band_ma)
+    bounce = np.where(np.abs(price[-1] - band_upper[-1]) <= near, -1,
+                      np.where(np.abs(price[-1] - band_lower[-1]) <= near, 1, 0))
+
+    # band touches: the price leaving the band through either side
+    touches = np.where(crossover(price, band_upper) == 1, -1, np.where(crossover(band_lower, price) == 1, 1, 0))
+
+    # See if the band squeeze in the last 20 days
+    width = np.diff(np.abs(band_upper - band_lower)[-SQUEEZE_WINDOW:], axis=0)
+    known = ~np.isnan(width)
+    with np.errstate(invalid='ignore'):
+        trend = np.where(known, width, 0).sum(axis=0) / known.sum(axis=0)
+    squeeze = -_signs(trend)
+
+    return Bollinger(ma, upper, lower, _out(bounce, lay), _out(squeeze, lay), events.index(_out(touches, lay)))
+
+def high_low_close(prices, lay=None):
+    # the last source stands in for the high and the first for the low, as in
+    # the original two-source (coindesk, nomics) Ichimoku Cloud
+    lay = lay or layout(prices.shape[1])
+    return _out(prices[:, lay.last], lay), _out(prices[:, lay.starts], lay), _out(aggregate(prices, lay), lay)
+
+def hlc(df, columns):
+    # real high / low from providers that supply OHLC columns, if any do
+    highs = [f'{c}_high' for c in columns if f'{c}_high' in df.columns and f'{c}_low' in df.columns]
+    if not highs:
+        return high_low_close(matrix(df, columns))
+    lows = [h[:-len('_high')] + '_low' for h in highs]
+    # fmax / fmin skip a source's missing value, as pandas' max / min do
+    # the close is the mean of the sources; compute() replaces it when they are combined otherwise
+    return np.fmax.reduce(matrix(df, highs), axis=1), np.fmin.reduce(matrix(df, lows), axis=1), \
+        matrix(df, columns).mean(axis=1)
+
+def ichimoku_cloud(high, low, close, n_1=9, n_2=26, n_3=52, n_4=26):
+
+    """
+    high, low, close are (dates,) for one asset or (dates, assets); with
+    several assets support / resistance are lists per asset.
+    """
+
+    def midpoint(n):
+        return (rolling_max(high, n) + rolling_min(low, n))/2
+
+    tenkan = midpoint(n_1) # Conversion Line (Tenkan sen)
+    kijun = midpoint(n_2) # Baseline (Kijun sen)
+    senkou_a = (tenkan + kijun)/2 # Leading span A
+    senkou_b = midpoint(n_3) # Leading span B
+    chikou = rolling_mean(shift(close, n_4), n_4) # Lagging span (Chikou span)
+
+    spans = np.stack([senkou_a[-1], senkou_b[-1]]).reshape(2, -1)
+    above = close[-1] >= spans
+    support = [[spans[k, g] for k in range(2) if above[k, g]] for g in range(spans.shape[1])]
+    resistance = [[spans[k, g] for k in range(2) if not above[k, g]] for g in range(spans.shape[1])]
+    if close.ndim == 1:
+        support, resistance = support[0], resistance[0]
+
+    kijun_crossover = crossover(close, kijun)
+    chikou_crossover = crossover(chikou, close)
+    kijun_events, chikou_events = events.index(kijun_crossover), events.index(chikou_crossover)
+
+    return Ichimoku(close, tenkan, kijun, senkou_a, senkou_b, chikou,
+                    kijun_crossover, chikou_crossover, support, resistance,
+                    latest_event(kijun_events), latest_event(chikou_events),
+                    kijun_events, chikou_events)
+
+def compute(prices, params=None, hlc=None, groups=None, how='mean', weights=None):
+
+    """
+    Compute every indicator over a price matrix in one pass.
+    Inputs:
+        - prices = NumPy array (dates, sources) of BTC-USD values
+        - params = Params (periods), defaults to the usual 12/26/9, 14, 20/2, 9/26/52/26
+        - hlc = optional (high, low, close) arrays for Ichimoku, see hlc()
+        - groups = asset of each column when prices holds several assets
+        (see layout()); summaries are then arrays with one value per asset
+        - how = how each asset's sources are combined: 'mean', 'median' or
+        'weighted' (by weights, or by reliability() when weights is None)
+    Outputs:
+        - Indicators holding the MACD, RSI, Bollinger and Ichimoku results
+    """
+
+    p = params or Params()
+    prices = np.asarray(prices, dtype='float64')
+    if how == 'weighted' and weights is None:
+        weights = reliability(prices, layout(prices.shape[1], groups))
+    lay = layout(prices.shape[1], groups, how, weights)
+
+    high, low, close = hlc or high_low_close(prices, lay)
+    if hlc is not None and how != 'mean':
+        close = _out(aggregate(prices, lay), lay) # hlc() closes on the mean
+
+    return Indicators(
+        macd(prices, p.macd_fast, p.macd_slow, p.macd_signal, lay),
+        rsi(prices, p.rsi_period, lay),
+        bollinger_band(prices, p.bollinger_period, p.bollinger_mul, lay),
+        ichimoku_cloud(high, low, close, p.tenkan, p.kijun, p.senkou, p.chikou),
+        p, lay)
@@ -0,0 +1,138 @@
+import numpy as np
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Crossover / event index.
+
+An event series (1 bullish, -1 bearish, 0 nothing, one value per row) is
+scanned once and only its non-zero rows are kept: their positions, sorted,
+and a running count of bullish ones. "Latest event" and "events since row
+t" (t = -n for the last n rows) are then binary searches instead of passes
+over the whole history. New rows are appended in place, so a live series
+keeps its index without rebuilding it.
+'''
+
+class EventIndex:
+
+    """
+    Inputs:
+        - events = optional (rows,) array of -1 / 0 / 1 to start from
+    Usage:
+        - latest(t) = (position, kind) of the last event at or before row t
+        - count_since(t, kind) = events at rows >= t (of one kind if given)
+        - latest_at(rows) = kind of the last event at or before every row
+    """
+
+    def __init__(self, events=None):
+        self._positions = np.zeros(16, dtype='int64')
+        self._kinds = np.zeros(16, dtype='int8')
+        self._ups = np.zeros(17, dtype='int64') # bullish events before the i-th
+        self.count = 0
+        self.length = 0 # rows seen
+        if events is not None:
+            self.append(events)
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f'EventIndex({self.count} events over {self.length} rows, latest {self.latest()})'
+
+    @property
+    def positions(self):
+        return self._positions[:self.count]
+
+    @property
+    def kinds(self):
+        return self._kinds[:self.count]
+
+    def _reserve(self, n):
+        # capacity doubles, so appending row by row stays O(1) amortized
+        if self.count + n <= len(self._positions):
+            return
+        size = max(2*len(self._positions), self.count + n)
+        for name in ('_positions', '_kinds'):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        ups = np.zeros(size + 1, dtype='int64')
+        ups[:self.count + 1] = self._ups[:self.count + 1]
+        self._ups = ups
+
+    def append(self, events):
+        """Index the events of the next len(events) rows"""
+        events = np.asarray(events).reshape(-1)
+        rows = np.flatnonzero(events)
+        n = len(rows)
+        if n:
+            self._reserve(n)
+            kinds = np.sign(events[rows]).astype('int8')
+            c = self.count
+            self._positions[c:c+n] = rows + self.length
+            self._kinds[c:c+n] = kinds
+            self._ups[c+1:c+n+1] = self._ups[c] + np.cumsum(kinds > 0)
+            self.count += n
+        self.length += len(events)
+        return self
+
+    def push(self, event):
+        """Index one more row (streaming)"""
+        if event:
+            self._reserve(1)
+            c = self.count
+            self._positions[c] = self.length
+            self._kinds[c] = 1 if event > 0 else -1
+            self._ups[c+1] = self._ups[c] + (event > 0)
+            self.count += 1
+        self.length += 1
+        return self
+
+    def _row(self, t):
+        # negative rows count back from the end, as in indexing
+        return t + self.length if t < 0 else t
+
+    def _before(self, t):
+        # number of events at rows <= t
+        if t is None:
+            return self.count
+        return int(np.searchsorted(self.positions, self._row(t), side='right'))
+
+    def latest(self, t=None):
+        """(position, kind) of the last event at or before row t (the last row by default), or None"""
+        i = self._before(t)
+        if i == 0:
+            return None
+        return int(self._positions[i-1]), int(self._kinds[i-1])
+
+    def latest_kind(self, t=None):
+        """Kind of the last event at or before row t, 0 if there is none"""
+        i = self._before(t)
+        return int(self._kinds[i-1]) if i else 0
+
+    def count_since(self, t, kind=None):
+        """Events at rows >= t; only bullish (1) or bearish (-1) ones if kind is given"""
+        i = int(np.searchsorted(self.positions, self._row(t), side='left'))
+        if kind is None:
+            return self.count - i
+        ups = int(self._ups[self.count] - self._ups[i])
+        return ups if kind > 0 else self.count - i - ups
+
+    def latest_at(self, rows=None):
+        """Kind of the last event at or before each row (all rows by default), 0 before the first"""
+        rows = np.arange(self.length) if rows is None else np.asarray(rows)
+        i = np.searchsorted(self.positions, rows, side='right')
+        return np.where(i > 0, self._kinds[np.maximum(i - 1, 0)] if self.count else 0, 0).astype('int')
+
+def index(events):
+    """EventIndex of a (rows,) event array, or a list of them for (rows, columns)"""
+    events = np.asarray(events)
+    if events.ndim == 1:
+        return EventIndex(events)
+    return [EventIndex(events[:, j]) for j in range(events.shape[1])]
@@ -1,7 +1,9 @@
-import pandas as pd
+from code import store
+from code import columnar
+from code import providers
+from code import profiling
 import os
-from datetime import datetime, date, timedelta
-import numpy as np
+from datetime import datetime, date, timezone
 
 __author__ = 'Duy Cao'
 __copyright__ = 'Duy Cao, 2020'
@@ -10,23 +12,147 @@ __status__ = 'release'
 __url__ = 'https://github.com/caominhduy/bitcoin-indicated'
 __version__ = '1.0'
 
-NOMICS_API_KEY = 'e19a802cb19367a00e3d66638e9e974f'
+START_DATE = date(2020, 1, 1)
 
-def live_data():
-    # Read historical exchange rate from Nomics
-    nomics_url = f'https://api.nomics.com/v1/exchange-rates/history?key={NOMICS_API_KEY}&start=2020-01-01T00%3A00%3A00Z&currency=BTC'
-    nomics_df = pd.read_json(nomics_url)
-    nomics_df['timestamp'] = nomics_df['timestamp'].dt.date
-    nomics_df = nomics_df.rename(columns={'timestamp':'date', 'rate':'nomics'})
-    latest_date = nomics_df['date'].max()
+def download(start=START_DATE, end=None, sources=None):
 
-    # Read historical exchange rate from Coindesk
-    coindesk_url = f'https://api.coindesk.com/v1/bpi/historical/close.json?start=2020-01-01&end={latest_date}'
-    df = pd.read_json(coindesk_url)
-    df = df.drop(['disclaimer', 'time'], 1)
-    df = df[:-2].reset_index().rename(columns={'index':'date', 'bpi':'coindesk'})
-    df['date'] = pd.to_datetime(df['date']).dt.date
+    """
+    Download every configured source from start (inclusive); remote sources
+    are fetched at the same time.
+    Outputs:
+        - Pandas DataFrame indexed by date, one close column per source plus
+        any OHLC columns; a source that failed is left out (NaN) rather than
+        failing the run
+    """
 
-    df = df.merge(nomics_df, on=['date'], how='inner')
+    end = end or datetime.now(timezone.utc).date()
+    sources = sources or providers.configured()
 
-    return df
+    # one breaker per provider and asset: a symbol a provider fails on does not stop the others
+    remote = {p.name: {**p.request(start, end), 'breaker': f'{p.name}/{p.symbol}'} for p in sources if p.remote}
+    results = {}
+    if remote:
+        # aiohttp is only loaded when there is something to download
+        from code import client
+        with profiling.span('fetch.remote'):
+            results = client.fetch_all(remote)
+
+    frames = []
+    for p in sources:
+        try:
+            with profiling.span(f'parse.{p.name}') as s:
+                if p.remote:
+                    if isinstance(results[p.name], Exception):
+                        raise results[p.name]
+                    frame = p.parse(results[p.name])
+                else:
+                    frame = p.load(start, end)
+                s.rows = len(frame)
+        except Exception as e:
+            print(f'Could not download {p.name}: {e!r}')
+            continue
+        frames.append(p.columns(frame))
+
+    with profiling.span('fetch.merge') as s:
+        df = providers.merge(frames)
+        s.rows = len(df)
+    names = providers.names(sources)
+    return df.reindex(columns=names + [c for c in df.columns if c not in names])
+
+def columns(sources=None, ohlc=False, df=None):
+    """Close column per source, plus the OHLC columns df actually has"""
+    names = providers.names(sources)
+    if not ohlc:
+        return names
+    extra = [f'{n}_{c}' for n in names for c in providers.OHLC]
+    if df is not None:
+        extra = [c for c in extra if c in df.columns]
+    return names + extra
+
+def complete(df, sources=None):
+    """Rows every source has a close for, with the OHLC columns there are"""
+    sources = sources or providers.configured()
+    return df[columns(sources, ohlc=True, df=df)].dropna(subset=providers.names(sources))
+
+def update(cached, sources=None):
+
+    """
+    Top up a stored frame with only the dates after its last complete one.
+    Inputs:
+        - cached = frame indexed by date, as kept by code.store (or None)
+        - sources = providers to use (sources.json, or CoinDesk and Nomics)
+    Outputs:
+        - merged frame indexed by date, ready for store.save
+    """
+
+    sources = sources or providers.configured()
+    names = providers.names(sources)
+
+    # Re-download from the last date every source had; that day may have been
+    # partial, and a source that was down last time gets its gap filled
+    known = cached is not None and set(names) <= set(cached.columns)
+    start = (store.last_date(complete(cached, sources)) if known else None) or START_DATE
+    merged = store.merge(cached, download(start, sources=sources))
+    if complete(merged, sources).empty:
+        raise RuntimeError('No price data: every source failed and nothing is stored')
+    return merged
+
+def live_data(offline=False, path=store.STORE_PATH, sources=None):
+
+    """
+    Merged price history, served from the local store and topped up with
+    only the dates after the last stored one.
+    Inputs:
+        - offline = True/False read the local store only, never the network
+        - path = location of the local store
+        - sources = providers to use (sources.json, or CoinDesk and Nomics)
+    Outputs:
+        - Pandas DataFrame with a date column, one close column per source and
+        any OHLC columns (dates every source has a close for)
+    """
+
+    sources = sources or providers.configured()
+    with profiling.span('store.load') as s:
+        cached = store.load(path)
+        s.rows = 0 if cached is None else len(cached)
+
+    if offline:
+        if cached is None:
+            raise FileNotFoundError(f'No local price store at {path}, run once without --offline first')
+        return complete(cached, sources).reset_index()
+
+    with profiling.span('fetch') as s:
+        merged = update(cached, sources)
+        s.rows = len(merged) - (0 if cached is None else len(cached))
+    with profiling.span('store.save', len(merged)):
+        store.save(merged, path)
+
+    return complete(merged, sources).reset_index()
+
+def live_columns(offline=False, path=store.STORE_PATH, sources=None):
+
+    """
+    The history live_data returns, as a memory-mapped code.columnar file.
+    Inputs: as live_data
+    Outputs:
+        - columnar.Columns: date and price columns are views of the mapped
+        file; the file is rewritten only when the store changed since
+    """
+
+    sources = sources or providers.configured()
+    mirror = store.columns_path(path)
+    names = providers.names(sources)
+
+    if not offline:
+        data = live_data(False, path, sources)
+    else:
+        cols = columnar.load(mirror)
+        fresh = cols is not None and set(names) <= set(cols.columns) \
+            and (store.modified(path) or 0) <= os.path.getmtime(mirror)
+        if fresh:
+            return cols
+        data = live_data(True, path, sources)
+
+    with profiling.span('columnar.write', len(data)):
+        columnar.write(data, mirror, columns(sources, ohlc=True, df=data))
+    return columnar.load(mirror)
@@ -0,0 +1,150 @@
+from code import atomic
+import pandas as pd
+import sqlite3
+import csv
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Score history.
+
+Every score is one row appended to an SQLite database in WAL mode: when it
+was recorded, the mode that produced it (all, macd, rsi, bollinger,
+ichimoku), the symbol, the price date, each indicator's share of the score
+and the score itself. An insert costs the same however long the history is,
+and runs that overlap (a cron job next to --serve) simply queue on the write
+lock. The website's score.csv is not the record any more, only a snapshot
+derived from the last two all-indicator rows and replaced by rename.
+'''
+
+HISTORY_PATH = 'data/scores.db'
+SNAPSHOT_PATH = 'docs/assets/data/score.csv'
+COMPONENTS = ['macd', 'rsi', 'bollinger', 'ichimoku']
+SNAPSHOT = ['date', 'current_score', 'past_score', 'quote'] + COMPONENTS
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now')),
+    mode TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    macd REAL,
+    rsi REAL,
+    bollinger REAL,
+    ichimoku REAL,
+    score REAL NOT NULL,
+    quote TEXT
+);
+CREATE INDEX IF NOT EXISTS scores_latest ON scores (mode, symbol, id);
+'''
+
+def connect(path=HISTORY_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path, timeout=30)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL') # WAL stays consistent; a power cut may lose the last row
+    db.executescript(SCHEMA)
+    return db
+
+def append(date, score, components=None, mode='all', symbol='BTC', quote=None, path=HISTORY_PATH):
+
+    """
+    Record one score.
+    Inputs:
+        - date = price date the score is for
+        - score = score, in percent
+        - components = dict of indicator (see COMPONENTS) to its share of the
+        score, in percent; indicators the mode does not use stay empty
+        - mode = what produced the score: 'all' or a single indicator
+    """
+
+    components = components or {}
+    unknown = set(components) - set(COMPONENTS)
+    if unknown:
+        raise ValueError(f'Unknown score components: {sorted(unknown)}')
+
+    db = connect(path)
+    try:
+        with db:
+            db.execute('INSERT INTO scores (mode, symbol, date, macd, rsi, bollinger, ichimoku, score, quote) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (mode, symbol, str(date), *[_number(components.get(c)) for c in COMPONENTS],
+                        float(score), quote))
+    finally:
+        db.close()
+
+def _number(x):
+    return None if x is None else float(x)
+
+def latest(mode='all', symbol='BTC', n=2, path=HISTORY_PATH):
+    """Last n rows of a mode, newest first, as dicts (through the index, not a scan)"""
+    db = connect(path)
+    try:
+        db.row_factory = sqlite3.Row
+        rows = db.execute('SELECT * FROM scores WHERE mode = ? AND symbol = ? ORDER BY id DESC LIMIT ?',
+                          (mode, symbol, n)).fetchall()
+    finally:
+        db.close()
+    return [dict(r) for r in rows]
+
+def read(mode=None, symbol=None, path=HISTORY_PATH):
+    """Whole history (of one mode / symbol if given) as a Pandas DataFrame, oldest first"""
+    where, args = [], []
+    for column, value in (('mode', mode), ('symbol', symbol)):
+        if value is not None:
+            where.append(f'{column} = ?')
+            args.append(value)
+    query = 'SELECT * FROM scores' + (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY id'
+    db = connect(path)
+    try:
+        return pd.read_sql_query(query, db, params=args)
+    finally:
+        db.close()
+
+def seed(snapshot=SNAPSHOT_PATH, path=HISTORY_PATH):
+
+    """
+    Start an empty history from an existing snapshot, so the first score
+    recorded still has the previous one to compare with.
+    """
+
+    if latest(n=1, path=path) or not os.path.exists(snapshot):
+        return
+    with open(snapshot, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if rows and rows[0].get('current_score'):
+        row = rows[0]
+        append(row['date'], row['current_score'], {c: row[c] for c in COMPONENTS if row.get(c)},
+               quote=row.get('quote'), path=path)
+
+def snapshot(out=SNAPSHOT_PATH, path=HISTORY_PATH):
+
+    """
+    Rewrite the website's score.csv from the last two all-indicator scores,
+    atomically (temporary file, then rename).
+    Outputs:
+        - dict of the snapshot row, or None if there is no score yet
+    """
+
+    rows = latest('all', n=2, path=path)
+    if not rows:
+        return None
+    current, past = rows[0], rows[-1]
+    row = {'date': current['date'], 'current_score': current['score'],
+           'past_score': past['score'], 'quote': current['quote'],
+           **{c: current[c] for c in COMPONENTS}}
+
+    with atomic.write(out, newline='') as f:
+        writer = csv.DictWriter(f, SNAPSHOT)
+        writer.writeheader()
+        writer.writerow({k: '' if v is None else v for k, v in row.items()})
+    return row
@@ -1,6 +1,13 @@
 from code import fetch
 from code import indicators
+from code import engine
+from code import backtest
+from code import providers
+from code import profiling
+from code import history
+from code import rules
 import pandas as pd
+import json
 import os
 
 __author__ = 'Duy Cao'
@@ -10,7 +17,8 @@ __status__ = 'release'
 __url__ = 'https://github.com/caominhduy/bitcoin-indicated'
 __version__ = '1.0'
 
-def process_macd(uptrend, crossover, max_score):
+def process_macd(uptrend, crossover):
+    # Say what MACD indicates; outputs its inputs to the scoring rules (code.rules)
     if uptrend == 1:
         trend = 'UP'
     elif uptrend == -1:
@@ -24,25 +32,26 @@ def process_macd(uptrend, crossover, max_score):
         pos = 'BELOW'
 
     print(f'MACD indicates: overall trend is {trend}, MACD crosses {pos} Signal line')
-    return uptrend*max_score + crossover*max_score
+    return {'macd_trend': uptrend, 'macd_crossover': crossover}
 
-def process_rsi(overbought, rsi, max_score):
+def process_rsi(overbought, rsi):
     if overbought == 1:
         moment = 'OVERBOUGHT'
         print(f'RSI indicates: Bitcoin is {moment}')
     elif overbought == -1:
-        trend = 'OVERSOLD'
+        moment = 'OVERSOLD'
         print(f'RSI indicates: Bitcoin is {moment}')
     else:
-        if rsi >= 50:
+        midline = rules.load().constants['midline']
+        if rsi >= midline:
             trend = 'UPTREND'
             print(f'RSI indicates: probably {trend}')
-        elif rsi < 50:
+        elif rsi < midline:
             trend = 'DOWNTREND'
             print(f'RSI indicates: probably {trend}')
-    return overbought*max_score*1.5 + (rsi>=50)*0.5*max_score
+    return {'rsi': rsi}
 
-def process_bollinger(bounce, squeeze, max_score):
+def process_bollinger(bounce, squeeze):
     if bounce == 1:
         bouncing = 'UP'
     elif bounce == -1:
@@ -56,18 +65,9 @@ def process_bollinger(bounce, squeeze, max_score):
         breakout = 'UNEXPECTED'
     print(f'Bollinger Band indicates: probably bouncing {bouncing}, breakout is {breakout}')
 
-    # if price is predicted bouncing up and breakout is expected,
-    # there is strong BUY signal as price will cross below support line
-    if squeeze == 1 and bounce == 1:
-        return -bounce*2*max_score
-    # if price is predicted bouncing down and breakout is expected,
-    # there is strong SELL signal as price will cross below support line
-    elif squeeze == 1 and bounce == -1:
-        return -bounce*2*max_score
-    else:
-        return -bounce*max_score
+    return {'bounce': bounce, 'squeeze': squeeze}
 
-def process_ichimoku(inputs, max_score):
+def process_ichimoku(inputs):
     support, resistance, kijun_trend, chikou_trend = inputs
     if len(support) > 0:
         print(f'Predicted lower support price(s) {support}')
@@ -82,99 +82,136 @@ def process_ichimoku(inputs, max_score):
     else:
         print('Chikou line predicts price going DOWN')
 
-    return kijun_trend*max_score + chikou_trend*max_score + len(support)*0.5*max_score + len(resistance)*-0.5*max_score
+    return {'kijun_trend': kijun_trend, 'chikou_trend': chikou_trend,
+            'support': len(support), 'resistance': len(resistance)}
 
 def process_score(score):
-    if score >= -100 and score < -70:
-        return 'You DEFINITELY should BUY'
-    if score >= -70 and score < -40:
-        return 'You MAYBE should BUY'
-    if score >= -40 and score < 40:
-        return 'You DEFINITELY should HOLD'
-    if score >= 40 and score < 70:
-        return 'You MAYBE should SELL'
-    else:
-        return 'You DEFINITELY should SELL'
-
-def web(score, date):
-    data = pd.read_csv('docs/assets/data/score.csv')
-    data['past_score'] = data['current_score']
-    past_score = data['past_score'].iloc[0]
-    data['current_score'] = score
-    data['date'] = date
-    data['quote'] = process_score(score)
-    data.to_csv('docs/assets/data/score.csv', index=False)
-
-def indicator(option):
-    score = 0
-
-    if option == 'all':
-        max_score = 1/9
-        data = fetch.live_data()
-        uptrend, crossover = indicators.macd(data, ['coindesk', 'nomics'])
-        score += process_macd(uptrend, crossover, max_score)
-        overbought, rsi = indicators.rsi(data, ['coindesk', 'nomics'], 14)
-        score += process_rsi(overbought, rsi, max_score)
-        bounce, squeeze = indicators.bollinger_band(data, ['coindesk', 'nomics'], 20, 2)
-        score += process_bollinger(bounce, squeeze, max_score)
-        output = indicators.ichimoku_cloud(data, ['coindesk', 'nomics'], 9, 26, 52, 26)
-        score += process_ichimoku(output, max_score)
-        score = round(score*100, 1)
-        if not os.path.exists('docs/assets/data/score.csv'):
-            pd.DataFrame({'date': [data['date'].iloc[-1]], 'current_score': [score], 'past_score': [score], 'quote': [process_score(score)]}).to_csv('docs/assets/data/score.csv', index=False)
-        print(score, data['date'].iloc[-1])
-        web(score, data['date'].iloc[-1])
-
-    if option == 'web':
-        max_score = 1/9
-        data = fetch.live_data()
-        uptrend, crossover = indicators.macd(data, ['coindesk', 'nomics'], auto=True)
-        score += process_macd(uptrend, crossover, max_score)
-        overbought, rsi = indicators.rsi(data, ['coindesk', 'nomics'], 14, auto=True)
-        score += process_rsi(overbought, rsi, max_score)
-        bounce, squeeze = indicators.bollinger_band(data, ['coindesk', 'nomics'], 20, 2, auto=True)
-        score += process_bollinger(bounce, squeeze, max_score)
-        output = indicators.ichimoku_cloud(data, ['coindesk', 'nomics'], 9, 26, 52, 26, auto=True)
-        score += process_ichimoku(output, max_score)
-        score = round(score*100, 1)
-        if not os.path.exists('docs/assets/data/score.csv'):
-            pd.DataFrame({'date': [data['date'].iloc[-1]], 'current_score': [score], 'past_score': [score], 'quote': [process_score(score)]}).to_csv('docs/assets/data/score.csv', index=False)
+    return rules.load().quote(score)
+
+def score_terms(data, auto=False, charts=True, how='mean', diagnostics=False):
+    # Each indicator's weighted term (keyed as in history.COMPONENTS) and the
+    # rounded 'score', by the rules of mode 'all'. Every indicator comes out of
+    # a single engine pass over the price matrix; charts are a separate stage,
+    # rendered in parallel only when asked for
+    sources = providers.configured()
+    columns = providers.names(sources)
+    with profiling.span('indicators', len(data)):
+        prices = engine.matrix(data, columns)
+        res = engine.compute(prices, hlc=engine.hlc(data, columns), how=how,
+                             weights=providers.weights(sources) if how == 'weighted' else None)
+
+    if diagnostics:
+        source_diagnostics(prices, res, columns)
+
+    if charts:
+        from code import render
+        render.publish(render.charts(data['date'], columns, prices, res), auto)
+
+    i = res.ichimoku
+    with profiling.span('score'):
+        values = {**process_macd(res.macd.uptrend, res.macd.latest_crossover),
+                  **process_rsi(rules.load().rsi_zone(res.rsi.latest), res.rsi.latest),
+                  **process_bollinger(res.bollinger.bounce, res.bollinger.squeeze),
+                  **process_ichimoku((i.support, i.resistance, i.kijun_trend, i.chikou_trend))}
+        return rules.load().terms(values, 'all')
+
+def source_diagnostics(prices, res, columns, path='data/sources.csv'):
+    # How each source reads on its own, and how much it counts in the consensus
+    table = pd.DataFrame(engine.diagnostics(prices, res), index=pd.Index(columns, name='source'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table.to_csv(path)
+    print(f'Consensus: {res.layout.how}')
+    print(table.to_string(float_format=lambda x: f'{x:.4g}'))
+
+def publish_score(score, date, components=None, mode='all'):
+    # Append to the score history; the website snapshot follows the all-indicator scores only
+    with profiling.span('publish'):
+        history.seed()
+        history.append(date, score, {k: round(float(v)*100, 1) for k, v in (components or {}).items() if k != 'score'},
+                       mode, quote=process_score(score))
+        if mode == 'all':
+            history.snapshot()
+
+def sweep(offline=False, grid_path=None, start=None, end=None):
+    # Rank indicator periods and weights by backtest over the stored history
+    from code import tuning
+    grid = None
+    if grid_path:
+        with open(grid_path) as f:
+            grid = json.load(f)
+    data = fetch.live_data(offline)
+    table = tuning.sweep(data, providers.names(), grid, start, end)
+    table.to_csv(tuning.RESULTS_PATH, index=False)
+    print(table.head(10).to_string())
+    print(f'{len(table)} configurations ranked, see {tuning.RESULTS_PATH}')
+
+def walk_forward(offline=False, grid_path=None, train=None, test=None, anchored=False):
+    # Pick periods and weights on each train window, score them on the test window after it
+    from code import walkforward
+    grid = None
+    if grid_path:
+        with open(grid_path) as f:
+            grid = json.load(f)
+    data = fetch.live_columns(offline)
+    table = walkforward.run(data, providers.names(), grid, train or walkforward.TRAIN,
+                            test or walkforward.TEST, anchored=anchored)
+    table.to_csv(walkforward.TABLE_PATH, index=False)
+    print(table[['window', 'train_start', 'test_start', 'test_end', 'total_return', 'default_return', 'buy_and_hold']].to_string(index=False))
+    s = walkforward.summary(table)
+    print(f"{s['windows']} windows out of sample: walk-forward {s['walk_forward']:.1%}, default {s['default']:.1%}, "
+          f"buy and hold {s['buy_and_hold']:.1%}; beat the default in {s['beat_default']:.0%} of windows")
+    print(f'See {walkforward.TABLE_PATH}')
+
+def batch(symbols, offline=False):
+    # Score a watchlist in one go and write a single consolidated table
+    from code import batch as batch_scoring
+    table = batch_scoring.run(symbols, offline)
+    table['quote'] = [process_score(s) for s in table['score']]
+    batch_scoring.save(table)
+    print(table[['symbol', 'date', 'score', 'quote']].to_string(index=False))
+
+def multi_timeframe(timeframes=None, path='docs/assets/data/timeframes.csv'):
+    # Score the intraday sources on several timeframes and combine them
+    from code import timeframes as resampling
+    sources = resampling.intraday()
+    frames = resampling.load(sources, timeframes or resampling.TIMEFRAMES)
+    table, combined = resampling.score(frames, providers.names(sources))
+    table['quote'] = [process_score(s) for s in table['score']]
+    table.to_csv(path, index=False)
+    print(table.to_string(index=False))
+    print(f'Combined {combined}: {process_score(combined)}')
+
+def indicator(option, offline=False, charts=True, how='mean', diagnostics=False):
+    # Weights, thresholds and quotes come from the scoring rules (code.rules)
+
+    if option in ('all', 'web'):
+        data = fetch.live_data(offline)
+        terms = score_terms(data, auto=option == 'web', charts=charts, how=how, diagnostics=diagnostics)
+        score = float(terms['score'])
         print(score, data['date'].iloc[-1])
-        web(score, data['date'].iloc[-1])
-
-
-    if option == 'macd':
-        max_score = 1/2
-        data = fetch.live_data()
-        uptrend, crossover = indicators.macd(data, ['coindesk', 'nomics'])
-        score += process_macd(uptrend, crossover, max_score)
-        score = round(score*100, 1)
-        pd.DataFrame({'date': [data['date'].iloc[-1]], 'score': [score], 'quote': [process_score(score)]}).to_csv('docs/assets/data/score.csv', index=False)
+        publish_score(score, data['date'].iloc[-1], terms)
+
+    if option in ('macd', 'rsi', 'bollinger', 'ichimoku'):
+        data = fetch.live_data(offline)
+        columns = providers.names()
+        if option == 'macd':
+            values = process_macd(*indicators.macd(data, columns, charts=charts))
+        if option == 'rsi':
+            values = process_rsi(*indicators.rsi(data, columns, 14, charts=charts))
+        if option == 'bollinger':
+            values = process_bollinger(*indicators.bollinger_band(data, columns, 20, 2, charts=charts))
+        if option == 'ichimoku':
+            values = process_ichimoku(indicators.ichimoku_cloud(data, columns, 9, 26, 52, 26, charts=charts))
+        terms = rules.load().terms(values, option)
+        score = float(terms['score'])
+        publish_score(score, data['date'].iloc[-1], terms, option)
         print(score)
 
-    if option == 'rsi':
-        max_score = 1/2
-        data = fetch.live_data()
-        overbought, rsi = indicators.rsi(data, ['coindesk', 'nomics'], 14)
-        score += process_rsi(overbought, rsi, max_score)
-        score = round(score*100, 1)
-        pd.DataFrame({'date': [data['date'].iloc[-1]], 'score': [score], 'quote': [process_score(score)]}).to_csv('docs/assets/data/score.csv', index=False)
-        print(score)
-
-    if option == 'bollinger':
-        max_score = 1/2
-        data = fetch.live_data()
-        bounce, squeeze = indicators.bollinger_band(data, ['coindesk', 'nomics'], 20, 2)
-        score += process_bollinger(bounce, squeeze, max_score)
-        score = round(score*100, 1)
-        pd.DataFrame({'date': [data['date'].iloc[-1]], 'score': [score], 'quote': [process_score(score)]}).to_csv('docs/assets/data/score.csv', index=False)
-        print(score)
-
-    if option == 'ichimoku':
-        max_score = 1/3
-        data = fetch.live_data()
-        output = indicators.ichimoku_cloud(data, ['coindesk', 'nomics'], 9, 26, 52, 26)
-        score += process_ichimoku(output, max_score)
-        score = round(score*100, 1)
-        pd.DataFrame({'date': [data['date'].iloc[-1]], 'score': [score], 'quote': [process_score(score)]}).to_csv('docs/assets/data/score.csv', index=False)
-        print(score)
+    if option == 'backtest':
+        data = fetch.live_columns(offline)
+        table, report = backtest.run(data, providers.names())
+        os.makedirs('data', exist_ok=True)
+        table.to_csv('data/backtest.csv', index=False)
+        print(f"Backtest {table['date'].iloc[0].date()} to {table['date'].iloc[-1].date()} ({len(data)} rows)")
+        print(f"Total return {report['total_return']:.1%} (buy and hold {report['buy_and_hold']:.1%})")
+        print(f"Max drawdown {report['max_drawdown']:.1%}, {report['trades']} trades, hit rate {report['hit_rate']:.1%}, exposure {report['exposure']:.1%}")
@@ -0,0 +1,172 @@
+from code import atomic
+from contextvars import ContextVar
+import threading
+import json
+import time
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Per-stage timing (python main.py --all --profile, or BTC_PROFILE=1).
+
+Stages are wrapped in span(); each records its wall and CPU time, the rows it
+handled and the stage it ran inside. When profiling is off, span() hands back
+one shared do-nothing object, so instrumented code pays a function call and
+nothing else. finish() writes the spans as JSON lines (appended, one run after
+another) or, for a .prom path, as Prometheus text (replaced every run).
+With dump=True the whole run is also recorded by cProfile and tracemalloc,
+saved next to the report as .pstats and .tracemalloc files.
+'''
+
+ENV = 'BTC_PROFILE' # 1, or a report path
+ENV_DUMP = 'BTC_PROFILE_DUMP'
+PROFILE_PATH = 'data/profile.jsonl'
+METRIC = 'bitcoin_indicated_stage'
+
+enabled = False
+SPANS = []
+_stack = ContextVar('stack', default=())
+_lock = threading.Lock()
+_run = {}
+
+class _Null:
+    # stands in for a span while profiling is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+_NULL = _Null()
+
+class _Span:
+    def __init__(self, stage, rows):
+        self.stage = stage
+        self.rows = rows
+
+    def __enter__(self):
+        # a context variable, so every thread and asyncio task nests on its own
+        stack = _stack.get()
+        self.parent = stack[-1] if stack else None
+        self.token = _stack.set(stack + (self.stage,))
+        self.wall, self.cpu = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall, cpu = time.perf_counter() - self.wall, time.process_time() - self.cpu
+        _stack.reset(self.token)
+        record(self.stage, wall, cpu, self.rows, self.parent)
+        return False
+
+def span(stage, rows=None):
+
+    """
+    Time a stage: with span('fetch.merge') as s: ...; s.rows = len(df)
+    """
+
+    if not enabled:
+        return _NULL
+    return _Span(stage, rows)
+
+def record(stage, wall, cpu, rows=None, parent=None, pid=None):
+    entry = {'stage': stage, 'parent': parent, 'wall': round(wall, 6), 'cpu': round(cpu, 6),
+             'rows': None if rows is None else int(rows), 'pid': pid or os.getpid()}
+    with _lock:
+        SPANS.append(entry)
+
+def drain():
+    """Spans recorded so far, removed (worker processes hand theirs back)"""
+    with _lock:
+        spans = SPANS[:]
+        del SPANS[:]
+    return spans
+
+def extend(spans, parent=None):
+    for s in spans:
+        record(s['stage'], s['wall'], s['cpu'], s['rows'], s['parent'] or parent, s['pid'])
+
+def requested():
+    """Report path asked for through the environment, or None"""
+    value = os.environ.get(ENV, '')
+    if value.lower() in ('', '0', 'false', 'no'):
+        return None
+    return PROFILE_PATH if value.lower() in ('1', 'true', 'yes') else value
+
+def start(path=PROFILE_PATH, dump=False):
+    global enabled
+    enabled = True
+    del SPANS[:]
+    _run.update(path=path, at=time.strftime('%Y-%m-%dT%H:%M:%S'), started=time.perf_counter(), cpu=time.process_time())
+
+    if dump or os.environ.get(ENV_DUMP):
+        import cProfile
+        import tracemalloc
+        _run['profiler'] = cProfile.Profile()
+        tracemalloc.start()
+        _run['profiler'].enable()
+
+def finish():
+
+    """
+    Stop profiling and write the report.
+    Outputs:
+        - path of the report
+    """
+
+    global enabled
+    if not enabled:
+        return None
+    enabled = False
+    path = _run['path']
+    root = os.path.splitext(path)[0]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    profiler = _run.pop('profiler', None)
+    if profiler is not None:
+        import tracemalloc
+        profiler.disable()
+        profiler.dump_stats(root + '.pstats')
+        tracemalloc.take_snapshot().dump(root + '.tracemalloc')
+        tracemalloc.stop()
+
+    record('total', time.perf_counter() - _run['started'], time.process_time() - _run['cpu'])
+    spans = drain()
+    if path.endswith('.prom'):
+        write_prometheus(spans, path)
+    else:
+        with open(path, 'a') as f:
+            for s in spans:
+                f.write(json.dumps({'run': _run['at'], **s}) + '\n')
+    return path
+
+def write_prometheus(spans, path):
+    totals = {}
+    for s in spans:
+        t = totals.setdefault(s['stage'], {'wall': 0.0, 'cpu': 0.0, 'rows': 0, 'count': 0})
+        t['wall'] += s['wall']
+        t['cpu'] += s['cpu']
+        t['rows'] += s['rows'] or 0
+        t['count'] += 1
+
+    lines = []
+    for kind, unit, help_text in (('wall', '_seconds', 'Wall time spent in the stage'),
+                                  ('cpu', '_seconds', 'CPU time of this process spent in the stage'),
+                                  ('rows', '', 'Rows handled by the stage'),
+                                  ('count', '', 'Times the stage ran')):
+        name = f'{METRIC}_{kind}{unit}'
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        lines += [f'{name}{{stage="{stage}"}} {t[kind]:g}' for stage, t in totals.items()]
+
+    with atomic.write(path) as f:
+        f.write('\n'.join(lines) + '\n')
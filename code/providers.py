@@ -0,0 +1,202 @@
+import pandas as pd
+import numpy as np
+import copy
+import json
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Price providers.
+
+A provider turns one source into a frame indexed by date with a close column
+and, when the source has them, open / high / low columns. Remote providers
+describe an HTTP request (fetched concurrently by code.client) and parse its
+JSON; local providers read a file. Provider types are registered by name, and
+which sources are used comes from sources.json, so a new CSV / Parquet dump or
+exchange OHLC file is a config entry, not a code change:
+
+    [
+        {"name": "coindesk"},
+        {"name": "nomics"},
+        {"name": "binance", "type": "csv", "path": "dumps/binance-btcusdt-1d.csv"}
+    ]
+
+A source may also carry "weight" for the weighted consensus (main.py
+--aggregate weighted); without any, sources are weighed by reliability.
+
+In the merged frame a source's close is the column named after it; OHLC
+columns are suffixed, e.g. binance_high.
+'''
+
+SOURCES_PATH = 'sources.json'
+DEFAULT_SOURCES = [{'name': 'coindesk'}, {'name': 'nomics'}]
+OHLC = ['open', 'high', 'low']
+AGG = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}
+
+REGISTRY = {}
+
+def register(cls):
+    REGISTRY[cls.type] = cls
+    return cls
+
+class Provider:
+    type = None
+    remote = False
+    timeout = 20
+    symbol = 'BTC'
+    weight = None # fixed weight in a weighted consensus, see weights()
+
+    def __init__(self, name=None, **options):
+        self.name = name or self.type
+        for k, v in options.items():
+            setattr(self, k, v)
+
+    def request(self, start, end):
+        """dict(url=..., timeout=...) for code.client, remote providers only"""
+        raise NotImplementedError
+
+    def parse(self, body):
+        """Frame indexed by date with close (and optionally open/high/low)"""
+        raise NotImplementedError
+
+    def load(self, start, end):
+        """Frame indexed by date with close (and optionally open/high/low), local providers only"""
+        raise NotImplementedError
+
+    def for_symbol(self, symbol):
+        """This provider for another asset, or None if it only serves self.symbol"""
+        return self if symbol == self.symbol else None
+
+    def columns(self, df):
+        # close keeps the source name so single-price sources look as before
+        return df.rename(columns={'close': self.name, **{c: f'{self.name}_{c}' for c in OHLC}})
+
+@register
+class CoinDesk(Provider):
+    type = 'coindesk'
+    remote = True
+    url = 'https://api.coindesk.com/v1/bpi/historical/close.json'
+
+    def request(self, start, end):
+        return dict(url=f'{self.url}?start={start}&end={end}', timeout=self.timeout)
+
+    def parse(self, body):
+        close = pd.Series(body['bpi'], dtype='float64')
+        close.index = pd.to_datetime(close.index).date
+        return close.to_frame('close')
+
+@register
+class Nomics(Provider):
+    type = 'nomics'
+    remote = True
+    url = 'https://api.nomics.com/v1/exchange-rates/history'
+    key = 'e19a802cb19367a00e3d66638e9e974f'
+    timeout = 30
+
+    def request(self, start, end):
+        return dict(url=f'{self.url}?key={self.key}&start={start}T00%3A00%3A00Z&currency={self.symbol}', timeout=self.timeout)
+
+    def for_symbol(self, symbol):
+        other = copy.copy(self)
+        other.symbol = symbol
+        return other
+
+    def parse(self, body):
+        df = pd.DataFrame(body, columns=['timestamp', 'rate'])
+        return pd.DataFrame({'close': df['rate'].astype('float64').to_numpy()},
+                            index=pd.to_datetime(df['timestamp']).dt.date.to_numpy())
+
+@register
+class CSV(Provider):
+
+    """
+    Local dump with a date (or timestamp) column and either close (or price)
+    or full open / high / low / close columns. A {symbol} placeholder in the
+    path makes it serve any asset, e.g. "dumps/{symbol}-usd.csv".
+    """
+
+    type = 'csv'
+    path = None
+
+    def read(self):
+        return pd.read_csv(self.path.format(symbol=self.symbol))
+
+    def for_symbol(self, symbol):
+        if '{symbol}' not in self.path:
+            return super().for_symbol(symbol)
+        other = copy.copy(self)
+        other.symbol = symbol
+        return other
+
+    def bars(self, start, end):
+        """Rows as they are in the file, indexed by time (UTC), from start to end inclusive"""
+        df = self.read()
+        df.columns = [c.lower() for c in df.columns]
+        when = 'date' if 'date' in df.columns else 'timestamp'
+        df = df.rename(columns={'price': 'close'})
+        index = pd.DatetimeIndex(pd.to_datetime(df[when]))
+        if index.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        df = df[[c for c in ['close'] + OHLC if c in df.columns]].astype('float64').set_axis(index)
+        keep = (index >= pd.Timestamp(start)) & (index < pd.Timestamp(end) + pd.Timedelta('1D'))
+        return df[keep]
+
+    def load(self, start, end):
+        # several rows per day (e.g. an hourly dump): keep the daily OHLC
+        from code import timeframes
+        df = self.bars(start, end)
+        daily = timeframes.resample_one(df, '1d')[[c for c in ['close'] + OHLC if c in df.columns]]
+        daily.index = daily.index.date
+        return daily
+
+@register
+class Parquet(CSV):
+    type = 'parquet'
+
+    def read(self):
+        return pd.read_parquet(self.path.format(symbol=self.symbol))
+
+def configured(path=SOURCES_PATH):
+    """Providers listed in sources.json, or CoinDesk and Nomics by default"""
+    entries = DEFAULT_SOURCES
+    if os.path.exists(path):
+        with open(path) as f:
+            entries = json.load(f)
+    return [REGISTRY[e.get('type', e['name'])](**e) for e in entries]
+
+def for_symbol(symbol, sources=None):
+    """Configured providers that can serve symbol"""
+    sources = [p.for_symbol(symbol) for p in (sources or configured())]
+    return [p for p in sources if p is not None]
+
+def names(sources=None):
+    return [p.name for p in (sources or configured())]
+
+def weights(sources=None):
+    """Per source weights set in sources.json (1 where unset), or None if no source sets one"""
+    sources = sources or configured()
+    if all(p.weight is None for p in sources):
+        return None
+    return np.array([1.0 if p.weight is None else float(p.weight) for p in sources])
+
+def merge(frames):
+
+    """
+    Join any number of provider frames on date in one pass.
+    Outputs:
+        - Pandas DataFrame indexed by sorted date, outer join (a date missing
+        from a source is NaN there)
+    """
+
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, axis=1, join='outer', sort=True)
+    df.index.name = 'date'
+    return df
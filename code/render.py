@@ -0,0 +1,188 @@
+from code import atomic
+from code import profiling
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+import hashlib
+import pickle
+import json
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Chart rendering, kept apart from scoring.
+
+Charts are described as plain jobs (kind, file name, arrays) built from engine
+results, then drawn with matplotlib's object-oriented Figure API on the
+non-interactive Agg canvas, which holds no global pyplot state, needs no
+display and is safe to run in several processes at once. This module is only
+imported when charts are asked for, so scoring alone never loads matplotlib.
+A job whose inputs hash the same as on the last render is skipped.
+'''
+
+IMAGE_DIR = 'docs/images'
+CACHE_PATH = 'data/render-cache.json'
+
+def _job(kind, name, title, **data):
+    return dict(kind=kind, name=name, title=title, data=data)
+
+def macd_charts(dates, columns, res):
+    return [_job('macd', f'macd-{c}', f'Data source: {c}', dates=dates,
+                 macd=res.macd[:, i], signal=res.signal[:, i])
+            for i, c in enumerate(columns)]
+
+def rsi_charts(dates, columns, res):
+    return [_job('rsi', f'rsi-{c}', f'Data source: {c}', dates=dates, rsi=res.rsi[:, i])
+            for i, c in enumerate(columns)]
+
+def bollinger_charts(dates, columns, prices, res):
+    return [_job('bollinger', f'bollinger-{c}', f'Data source: {c}', dates=dates,
+                 upper=res.upper[:, i], lower=res.lower[:, i], ma=res.ma[:, i], price=prices[:, i])
+            for i, c in enumerate(columns)]
+
+def ichimoku_charts(dates, columns, res):
+    return [_job('ichimoku', 'ichimoku', f'Data source: {columns}', dates=dates,
+                 close=res.close, tenkan=res.tenkan, kijun=res.kijun,
+                 senkou_a=res.senkou_a, senkou_b=res.senkou_b, chikou=res.chikou)]
+
+def charts(dates, columns, prices, res):
+    """Every chart for an engine.Indicators result"""
+    dates = np.asarray(dates)
+    return macd_charts(dates, columns, res.macd) + rsi_charts(dates, columns, res.rsi) \
+        + bollinger_charts(dates, columns, prices, res.bollinger) \
+        + ichimoku_charts(dates, columns, res.ichimoku)
+
+
+def _draw_macd(ax, d):
+    ax.plot(d['dates'], [0]*len(d['dates']), '--')
+    ax.plot(d['dates'], d['macd'], label='MACD', color='blue')
+    ax.plot(d['dates'], d['signal'], label='Signal', color='tomato')
+    return 'MACD'
+
+def _draw_rsi(ax, d):
+    ax.plot(d['dates'], d['rsi'], label='RSI', color='tomato')
+    ax.set_ylim(bottom=0)
+    ax.fill_between(d['dates'], 30, 70, alpha=0.3, color='indigo')
+    return 'RSI'
+
+def _draw_bollinger(ax, d):
+    ax.plot(d['dates'], d['upper'], label='Upper Band')
+    ax.plot(d['dates'], d['lower'], label='Lower Band')
+    ax.plot(d['dates'], d['ma'], label='MA')
+    ax.plot(d['dates'], d['price'], label='BTC-USD')
+    ax.fill_between(d['dates'], d['upper'], d['lower'], alpha=0.3, color='indigo')
+    return 'Bollinger Band'
+
+def _draw_ichimoku(ax, d):
+    dates, sankou_a, sankou_b = d['dates'], d['senkou_a'], d['senkou_b']
+    ax.plot(dates, d['close'], label='Price', color='black')
+    ax.plot(dates, d['tenkan'], label='Conversion (Tenkan)', color='crimson')
+    ax.plot(dates, d['kijun'], label='Baseline (Kijun)', color='darkblue')
+    ax.plot(dates, sankou_a, label='Leading Span A (Sankou A)')
+    ax.plot(dates, sankou_b, label='Leading Span B (Sankou B)')
+    ax.fill_between(dates, sankou_a, sankou_b, where=sankou_a>=sankou_b, facecolor='green', alpha=0.5, interpolate=True)
+    ax.fill_between(dates, sankou_a, sankou_b, where=sankou_b>=sankou_a, facecolor='red', alpha=0.5, interpolate=True)
+    ax.plot(dates, d['chikou'], label='Lagging Span (Chikou)', color='green')
+    return 'Ichimoku Cloud'
+
+DRAW = {'macd': _draw_macd, 'rsi': _draw_rsi, 'bollinger': _draw_bollinger, 'ichimoku': _draw_ichimoku}
+
+def draw(fig, job):
+    ax = fig.subplots()
+    suptitle = DRAW[job['kind']](ax, job['data'])
+    ax.legend()
+    fig.suptitle(suptitle, fontsize=16)
+    ax.set_title(job['title'], fontsize=10)
+    return fig
+
+def _render_one(job, image_dir=IMAGE_DIR):
+    with profiling.span(f"render.{job['name']}"):
+        fig = draw(Figure(), job)
+        FigureCanvasAgg(fig)
+        fig.savefig(f"{image_dir}/{job['name']}.jpg", dpi=300, pil_kwargs={'quality': 95})
+        fig.savefig(f"{image_dir}/{job['name']}.svg")
+    return job['name']
+
+def _render_profiled(job, image_dir=IMAGE_DIR):
+    # in a worker process: time the chart there and hand the spans back
+    profiling.enabled = True
+    profiling.drain()
+    name = _render_one(job, image_dir)
+    return name, profiling.drain()
+
+def digest(job):
+    return hashlib.sha1(pickle.dumps((job['kind'], job['title'], job['data']))).hexdigest()
+
+def _load_cache(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def _save_cache(cache, path):
+    with atomic.write(path) as f:
+        json.dump(cache, f, indent=1)
+
+def render(jobs, workers=None, force=False, image_dir=IMAGE_DIR, cache_path=CACHE_PATH):
+
+    """
+    Save each chart as a 300-dpi JPG and an SVG, in parallel.
+    Inputs:
+        - jobs = chart jobs (see charts())
+        - workers = size of the process pool (all cores by default, 1 renders inline)
+        - force = True/False render even if the inputs did not change
+    Outputs:
+        - names of the charts that were (re)rendered
+    """
+
+    cache = _load_cache(cache_path)
+    todo = []
+    for job in jobs:
+        key = digest(job)
+        exists = os.path.exists(f"{image_dir}/{job['name']}.jpg") and os.path.exists(f"{image_dir}/{job['name']}.svg")
+        if force or not exists or cache.get(job['name']) != key:
+            todo.append((job, key))
+
+    if not todo:
+        return []
+
+    with profiling.span('render', len(todo)):
+        if workers == 1 or len(todo) == 1:
+            done = [_render_one(job, image_dir) for job, _ in todo]
+        elif profiling.enabled:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                done = []
+                for name, spans in pool.map(_render_profiled, [job for job, _ in todo], [image_dir]*len(todo)):
+                    profiling.extend(spans, 'render')
+                    done.append(name)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                done = list(pool.map(_render_one, [job for job, _ in todo], [image_dir]*len(todo)))
+
+    for job, key in todo:
+        cache[job['name']] = key
+    _save_cache(cache, cache_path)
+
+    return done
+
+def show(jobs):
+    # Interactive windows need pyplot, only loaded when someone asks for them
+    import matplotlib.pyplot as plt
+    if plt.get_backend().lower() == 'agg':
+        return # no display (cron, containers): the saved images are all there is
+    for job in jobs:
+        draw(plt.figure(), job)
+        plt.show()
+
+def publish(jobs, auto=False, workers=None):
+    """Render the charts, then show them unless running unattended (auto=True)"""
+    render(jobs, workers)
+    if auto == False:
+        show(jobs)
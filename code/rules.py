@@ -0,0 +1,386 @@
+from code import engine
+import numpy as np
+import hashlib
+import copy
+import json
+import ast
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Scoring rules.
+
+How indicator readings turn into a score is data, not code: each indicator's
+term is an arithmetic expression over named inputs (MACD trend, RSI value,
+Bollinger bounce, ...), each mode has a weight per term, and the quote and the
+buy / sell signal are bands of the score. The defaults below are the original
+rules; a rules.json (or rules.toml / rules.yaml) next to main.py overrides any
+part of them:
+
+    {
+        "constants": {"overbought": 75, "oversold": 25},
+        "weights": {"all": {"rsi": "1/6"}}
+    }
+
+Expressions are checked once when the rules are loaded (only arithmetic,
+comparisons, and / or / not, x if c else y and the FUNCTIONS below, over
+known names) and compiled to Python code objects that run NumPy operations,
+so the same rule set scores the latest reading, every date of a history or
+every asset of a watchlist in one call.
+'''
+
+RULES_PATHS = ['rules.json', 'rules.toml', 'rules.yaml', 'rules.yml']
+TERMS = ['macd', 'rsi', 'bollinger', 'ichimoku']
+
+INPUTS = {
+    'macd_trend': 'sign of the MACD line: 1 up, -1 down',
+    'macd_crossover': 'latest MACD / Signal crossover: 1 above, -1 below, 0 none yet',
+    'rsi': 'RSI, consensus over sources',
+    'bounce': 'price near a Bollinger band: 1 the lower, -1 the upper, 0 neither',
+    'squeeze': 'Bollinger band width: 1 contracting, -1 widening',
+    'kijun_trend': 'latest price / Kijun crossover: 1 above, -1 below',
+    'chikou_trend': 'latest Chikou / price crossover: 1 above, -1 below',
+    'support': 'Ichimoku leading spans below the price (0 to 2)',
+    'resistance': 'Ichimoku leading spans above the price (0 to 2)',
+}
+
+FUNCTIONS = {'where': np.where, 'sign': np.sign, 'abs': np.abs, 'minimum': np.minimum,
+             'maximum': np.maximum, 'clip': np.clip, 'isnan': np.isnan}
+
+DEFAULT_RULES = {
+    'constants': {'overbought': 70, 'oversold': 30, 'midline': 50},
+    'terms': {
+        'macd': 'macd_trend + macd_crossover',
+        'rsi': '1.5*((rsi > overbought) - (rsi < oversold)) + 0.5*(rsi >= midline)',
+        # a bounce counts double when the band squeezes (a breakout is expected)
+        'bollinger': '-bounce*(2 if squeeze == 1 else 1)',
+        'ichimoku': 'kijun_trend + chikou_trend + 0.5*support - 0.5*resistance',
+    },
+    'weights': {
+        'all': {'macd': '1/9', 'rsi': '1/9', 'bollinger': '1/9', 'ichimoku': '1/9'},
+        'macd': {'macd': '1/2'},
+        'rsi': {'rsi': '1/2'},
+        'bollinger': {'bollinger': '1/2'},
+        'ichimoku': {'ichimoku': '1/3'},
+    },
+    'quotes': [
+        {'below': -70, 'quote': 'You DEFINITELY should BUY'},
+        {'below': -40, 'quote': 'You MAYBE should BUY'},
+        {'below': 40, 'quote': 'You DEFINITELY should HOLD'},
+        {'below': 70, 'quote': 'You MAYBE should SELL'},
+        {'quote': 'You DEFINITELY should SELL'},
+    ],
+    'signals': {'buy_below': -40, 'sell_from': 40},
+}
+
+
+# Expressions
+
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+              ast.USub, ast.UAdd, ast.Not, ast.And, ast.Or,
+              ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+def _float(x):
+    # comparisons give booleans; as 0.0 / 1.0 they add and subtract like the original rules
+    return np.multiply(x, 1.0)
+
+def _all(*xs):
+    return _float(np.logical_and.reduce(np.broadcast_arrays(*xs)))
+
+def _any(*xs):
+    return _float(np.logical_or.reduce(np.broadcast_arrays(*xs)))
+
+def _not(x):
+    return _float(np.logical_not(x))
+
+class _Vectorize(ast.NodeTransformer):
+    # rewrite what Python evaluates element by element into NumPy calls
+
+    def _call(self, name, args):
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=args, keywords=[])
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        operands = [node.left] + node.comparators
+        pairs = [self._call('_float', [ast.Compare(left=a, ops=[op], comparators=[b])])
+                 for a, op, b in zip(operands, node.ops, operands[1:])]
+        return pairs[0] if len(pairs) == 1 else self._call('_all', pairs) # 30 < rsi < 70
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        return self._call('_all' if isinstance(node.op, ast.And) else '_any', node.values)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        return self._call('_not', [node.operand]) if isinstance(node.op, ast.Not) else node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return self._call('where', [node.test, node.body, node.orelse])
+
+class Expression:
+
+    """
+    One compiled rule expression.
+    Usage:
+        - Expression('rsi > 70', INPUTS)(rsi=np.array([65, 75])) = array([0., 1.])
+        - names = inputs / constants it reads
+    """
+
+    def __init__(self, text, names, label='expression'):
+        self.text = str(text)
+        try:
+            tree = ast.parse(self.text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f'{label}: cannot parse {self.text!r} ({e.msg})') from None
+
+        used = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                if node.id not in names and node.id not in FUNCTIONS:
+                    raise ValueError(f'{label}: unknown name {node.id!r} in {self.text!r}, '
+                                     f'use one of {sorted(names)} or {sorted(FUNCTIONS)}')
+                if node.id not in FUNCTIONS:
+                    used.add(node.id)
+            elif isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                    raise ValueError(f'{label}: only {sorted(FUNCTIONS)} can be called, in {self.text!r}')
+            elif isinstance(node, ast.Constant):
+                if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                    raise ValueError(f'{label}: only numbers are allowed as literals, in {self.text!r}')
+            elif not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+                                       ast.IfExp, ast.Load) + _OPERATORS):
+                raise ValueError(f'{label}: {type(node).__name__} is not allowed, in {self.text!r}')
+
+        self.names = used
+        tree = ast.fix_missing_locations(_Vectorize().visit(tree))
+        self.code = compile(tree, f'<{label}>', 'eval')
+
+    def __repr__(self):
+        return f'Expression({self.text!r})'
+
+    def __call__(self, **values):
+        scope = {'__builtins__': {}, '_float': _float, '_all': _all, '_any': _any, '_not': _not, **FUNCTIONS}
+        return eval(self.code, scope, values)
+
+def _constant(value, label):
+    # weights and thresholds may be written as numbers or as constant expressions, e.g. "1/9"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float(Expression(value, {}, label)())
+
+
+# Rule sets
+
+def _merge(base, override):
+    out = copy.deepcopy(base)
+    for k, v in override.items():
+        out[k] = _merge(out[k], v) if isinstance(v, dict) and isinstance(out.get(k), dict) else v
+    return out
+
+class RuleSet:
+
+    """
+    Compiled scoring rules (see DEFAULT_RULES for the layout of spec).
+    Usage:
+        - terms(values, mode) = dict of each weighted term of the mode plus 'score'
+        - combine(units, weights) = the same from unweighted terms, for many weightings of one reading
+        - quote(score) = the quote of a score (an array of them for an array)
+        - rsi_zone(rsi) = overbought / oversold reading by the same thresholds
+        - digest = short hash of the whole spec, the same for the same rules
+    Values are the INPUTS, as scalars (one reading), (dates,) histories or
+    (dates, assets) blocks; everything broadcasts.
+    """
+
+    def __init__(self, spec=None):
+        self.spec = _merge(DEFAULT_RULES, spec or {})
+        # identity of the rules, for caches and checkpoints of scores made with them
+        self.digest = hashlib.sha1(json.dumps(self.spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+        unknown = set(self.spec) - set(DEFAULT_RULES)
+        if unknown:
+            raise ValueError(f'Unknown rule sections: {sorted(unknown)}')
+        clash = set(self.spec['constants']) & (set(INPUTS) | set(FUNCTIONS))
+        if clash:
+            raise ValueError(f'Constants cannot reuse input or function names: {sorted(clash)}')
+        self.constants = {k: _constant(v, f'constant {k}') for k, v in self.spec['constants'].items()}
+
+        unknown = set(self.spec['terms']) - set(TERMS)
+        if unknown:
+            raise ValueError(f'Unknown terms {sorted(unknown)}, terms are {TERMS}')
+        names = set(INPUTS) | set(self.constants)
+        self.expressions = {t: Expression(e, names, f'term {t}') for t, e in self.spec['terms'].items()}
+
+        self.weights = {}
+        for mode, weights in self.spec['weights'].items():
+            unknown = set(weights) - set(self.expressions)
+            if unknown:
+                raise ValueError(f'Weights of mode {mode!r} for unknown terms: {sorted(unknown)}')
+            self.weights[mode] = {t: _constant(w, f'weight {mode}.{t}') for t, w in weights.items()}
+        if 'all' not in self.weights:
+            raise ValueError("Rules need the weights of mode 'all'")
+
+        bands = self.spec['quotes']
+        if not bands or 'below' in bands[-1] or any('below' not in b for b in bands[:-1]):
+            raise ValueError('Quotes are bands with a "below" bound each, the last one without')
+        self.bounds = np.array([_constant(b['below'], f'quote {b.get("quote")!r} bound') for b in bands[:-1]])
+        if (np.diff(self.bounds) <= 0).any():
+            raise ValueError('Quote bounds must increase')
+        self.quotes = np.array([b['quote'] for b in bands], dtype=object)
+
+        self.buy_below = _constant(self.spec['signals']['buy_below'], 'signal buy_below')
+        self.sell_from = _constant(self.spec['signals']['sell_from'], 'signal sell_from')
+
+    def units(self, values, terms=None):
+        """Unweighted term expressions (all of them, or those named in terms)"""
+        scope = {**self.constants, **values}
+        out = {}
+        for t in terms or self.expressions:
+            e = self.expressions[t]
+            missing = e.names - set(scope)
+            if missing:
+                raise ValueError(f'Term {t} needs inputs {sorted(missing)}')
+            out[t] = e(**{n: scope[n] for n in e.names})
+        return out
+
+    def terms(self, values, mode='all', weights=None):
+
+        """
+        Inputs:
+            - values = dict of input name to value (see INPUTS)
+            - mode = whose weights to use ('all' or a single indicator)
+            - weights = optional per-term override of the mode's weights
+        Outputs:
+            - dict of each weighted term of the mode plus the composite
+            'score', rounded on the -100..100 scale
+        """
+
+        w = {**self.weights[mode], **(weights or {})}
+        return self.combine(self.units(values, list(w)), w)
+
+    def combine(self, units, weights):
+        """Weighted terms and rounded 'score' of unweighted term values (see units)"""
+        out = {t: units[t]*weights[t] for t in weights}
+        out['score'] = np.round(sum(out.values())*100, 1)
+        return out
+
+    def rsi_zone(self, rsi):
+        """1 overbought, -1 oversold, 0 in between, by the constants the RSI term reads"""
+        c = self.constants
+        zone = np.where(rsi > c['overbought'], 1, np.where(rsi < c['oversold'], -1, 0))
+        return zone if np.ndim(zone) else int(zone)
+
+    def quote(self, score):
+        i = np.searchsorted(self.bounds, score, side='right')
+        return self.quotes[i] if np.ndim(i) else str(self.quotes[i])
+
+_cache = {}
+
+def path():
+    """Rules file in use, or None for the defaults"""
+    return next((p for p in RULES_PATHS if os.path.exists(p)), None)
+
+def read(file):
+    # JSON always; TOML with Python 3.11+ (tomllib); YAML when PyYAML is installed
+    if file.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            raise ImportError(f'{file} needs Python 3.11+ (tomllib), or write the rules as JSON') from None
+        with open(file, 'rb') as f:
+            return tomllib.load(f)
+    if file.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError(f'{file} needs PyYAML (pip install pyyaml), or write the rules as JSON') from None
+        with open(file) as f:
+            return yaml.safe_load(f) or {}
+    with open(file) as f:
+        return json.load(f)
+
+def load(file=None):
+
+    """
+    Rules from file (the first of RULES_PATHS that exists by default), or
+    the defaults. Compiled once and reused until the file changes.
+    """
+
+    file = file or path()
+    stamp = (file, os.path.getmtime(file)) if file else None
+    if stamp not in _cache:
+        _cache.clear()
+        _cache[stamp] = RuleSet(read(file) if file else None)
+    return _cache[stamp]
+
+
+# Inputs
+
+def _squeeze(x, lay):
+    # one asset: drop the asset axis
+    return np.asarray(x)[..., 0] if lay.single else x
+
+def _events(index):
+    # kind of the latest event at every row, (dates,) or (dates, assets)
+    if isinstance(index, list):
+        return np.stack([i.latest_at() for i in index], axis=-1)
+    return index.latest_at()
+
+def history(res, prices):
+
+    """
+    Every input at every date.
+    Inputs:
+        - res = engine.Indicators computed on prices
+        - prices = NumPy array (dates, sources) the indicators were computed on
+    Outputs:
+        - dict of INPUTS name to (dates,) arrays, (dates, assets) with several assets
+    """
+
+    lay = res.layout or engine.layout(prices.shape[1])
+
+    b = res.bollinger
+    price = _squeeze(prices[:, lay.starts], lay)
+    upper, lower, ma = (_squeeze(engine.aggregate(x, lay), lay) for x in (b.upper, b.lower, b.ma))
+    near = 0.3*np.abs(price - ma)
+    bounce = np.where(np.abs(price - upper) <= near, -1, np.where(np.abs(price - lower) <= near, 1, 0))
+    width = np.diff(np.abs(upper - lower), axis=0, prepend=np.nan)
+    width = engine._frame(width).rolling(engine.SQUEEZE_WINDOW - 1, min_periods=1).mean().to_numpy()
+
+    i = res.ichimoku
+    support = (i.close >= i.senkou_a).astype('int') + (i.close >= i.senkou_b)
+
+    return {
+        'macd_trend': np.sign(np.nan_to_num(_squeeze(res.macd.macd[:, lay.last], lay))),
+        'macd_crossover': _events(res.macd.events),
+        'rsi': res.rsi.consensus,
+        'bounce': bounce,
+        'squeeze': -np.sign(np.nan_to_num(width)),
+        'kijun_trend': _events(i.kijun_events),
+        'chikou_trend': _events(i.chikou_events),
+        'support': support,
+        'resistance': 2 - support,
+    }
+
+def latest(res):
+    """Every input at the last date, from the engine's summaries (per asset arrays with several assets)"""
+    i = res.ichimoku
+    single = res.layout.single if res.layout is not None else not (i.support and isinstance(i.support[0], list))
+    support = len(i.support) if single else np.array([len(s) for s in i.support])
+    return {
+        'macd_trend': res.macd.uptrend,
+        'macd_crossover': res.macd.latest_crossover,
+        'rsi': res.rsi.latest,
+        'bounce': res.bollinger.bounce,
+        'squeeze': res.bollinger.squeeze,
+        'kijun_trend': i.kijun_trend,
+        'chikou_trend': i.chikou_trend,
+        'support': support,
+        'resistance': 2 - support,
+    }
@@ -0,0 +1,93 @@
+from code import atomic
+import pandas as pd
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+STORE_PATH = 'data/prices.parquet'
+
+def _fallback(path):
+    # Parquet needs pyarrow (or fastparquet); without it we keep a pickle next to it
+    return os.path.splitext(path)[0] + '.pkl'
+
+def load(path=STORE_PATH):
+
+    """
+    Read the local price store.
+    Inputs:
+        - path = location of the store (Parquet, or its pickle fallback)
+    Outputs:
+        - Pandas DataFrame indexed by date (one column per source),
+        or None if nothing has been stored yet
+    """
+
+    if os.path.exists(path):
+        df = pd.read_parquet(path)
+    elif os.path.exists(_fallback(path)):
+        df = pd.read_pickle(_fallback(path))
+    else:
+        return None
+
+    df.index = pd.to_datetime(df.index).date
+    df.index.name = 'date'
+    return df
+
+def save(df, path=STORE_PATH):
+
+    """
+    Write the whole store atomically (temporary file, then rename), so an
+    interrupted run never leaves a half-written cache behind.
+    Inputs:
+        - df = Pandas DataFrame indexed by date
+        - path = location of the store
+    """
+
+    try:
+        with atomic.write(path, 'wb') as f:
+            df.to_parquet(f)
+    except ImportError:
+        with atomic.write(_fallback(path), 'wb') as f:
+            df.to_pickle(f)
+
+def columns_path(path=STORE_PATH):
+    # memory-mapped mirror of the complete history (see code.columnar)
+    return os.path.splitext(path)[0] + '.cols'
+
+def modified(path=STORE_PATH):
+    """Modification time of the store (or its pickle fallback), None if there is none"""
+    for p in (path, _fallback(path)):
+        if os.path.exists(p):
+            return os.path.getmtime(p)
+    return None
+
+def last_date(df):
+    if df is None or df.empty:
+        return None
+    return df.index.max()
+
+def merge(cached, new):
+
+    """
+    Fold newly downloaded rows into the cached frame.
+    Inputs:
+        - cached = stored frame indexed by date (or None)
+        - new = freshly downloaded frame indexed by date
+    Outputs:
+        - merged frame, sorted by date; values in new replace cached ones for
+        the same date (the most recent day may have been partial), while a
+        source missing from new keeps its cached value
+    """
+
+    if cached is None or cached.empty:
+        merged = new
+    elif new is None or new.empty:
+        merged = cached
+    else:
+        columns = list(dict.fromkeys(list(cached.columns) + list(new.columns)))
+        merged = new.combine_first(cached)[columns]
+    return merged.sort_index()
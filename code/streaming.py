@@ -0,0 +1,395 @@
+from code import atomic
+from code import engine
+from code import events
+from code import rules
+from collections import deque
+import numpy as np
+import pickle
+import math
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Incremental (streaming) indicators.
+
+Each calculator takes one new observation per update() in constant time and
+follows the same conventions as code.engine (pandas ewm with adjust=False,
+rolling windows that stay NaN until full), so a stream fed with the whole
+history ends on the same values as a batch run. A StreamingIndicators object
+can be written to disk with snapshot() and picked up again with restore().
+'''
+
+NAN = float('nan')
+
+class EMA:
+    def __init__(self, span):
+        self.alpha = 2 / (span + 1)
+        self.value = NAN
+
+    def update(self, x):
+        if math.isnan(self.value):
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+class RollingMean:
+    # NaN inputs are counted rather than summed, so one NaN only blanks the
+    # windows it falls into (as pandas' rolling mean does)
+    def __init__(self, n):
+        self.n = n
+        self.window = deque()
+        self.total = 0.0
+        self.nans = 0
+        self.value = NAN
+
+    def update(self, x):
+        self.window.append(x)
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+        if len(self.window) > self.n:
+            old = self.window.popleft()
+            if math.isnan(old):
+                self.nans -= 1
+            else:
+                self.total -= old
+        full = len(self.window) == self.n and self.nans == 0
+        self.value = self.total / self.n if full else NAN
+        return self.value
+
+class RollingMeanStd:
+    # Welford's running mean / sum of squared deviations, extended to slide:
+    # the oldest value leaves in the same step as the new one arrives. NaN
+    # inputs are counted and kept out of the sums, so a gap only blanks the
+    # windows it falls into (as pandas' rolling std does)
+    def __init__(self, n):
+        self.n = n
+        self.window = deque()
+        self.count = 0 # values in the sums
+        self.nans = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def _remove(self, x):
+        self.count -= 1
+        if self.count == 0:
+            self.mean = self.m2 = 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / self.count
+        self.m2 -= delta * (x - self.mean)
+
+    def update(self, x):
+        self.window.append(x)
+        old = self.window.popleft() if len(self.window) > self.n else None
+        if old is not None and not math.isnan(x) and not math.isnan(old):
+            mean = self.mean + (x - old) / self.count
+            self.m2 += (x - old) * (x - mean + old - self.mean)
+            self.mean = mean
+        else:
+            if old is not None:
+                if math.isnan(old):
+                    self.nans -= 1
+                else:
+                    self._remove(old)
+            if math.isnan(x):
+                self.nans += 1
+            else:
+                self._add(x)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.window) < self.n or self.nans:
+            return NAN, NAN
+        return self.mean, math.sqrt(max(self.m2, 0) / (self.n - 1))
+
+class RollingExtreme:
+    # Monotonic deque: values that can never be the extreme again are dropped
+    # on arrival, so every value is pushed and popped at most once
+    def __init__(self, n, maximum=True):
+        self.n = n
+        self.maximum = maximum
+        self.window = deque() # (position, value)
+        self.count = 0
+        self.value = NAN
+
+    def update(self, x):
+        if self.maximum:
+            while self.window and self.window[-1][1] <= x:
+                self.window.pop()
+        else:
+            while self.window and self.window[-1][1] >= x:
+                self.window.pop()
+        self.window.append((self.count, x))
+        self.count += 1
+        if self.window[0][0] <= self.count - 1 - self.n:
+            self.window.popleft()
+        self.value = self.window[0][1] if self.count >= self.n else NAN
+        return self.value
+
+def RollingMax(n):
+    return RollingExtreme(n, maximum=True)
+
+def RollingMin(n):
+    return RollingExtreme(n, maximum=False)
+
+class Crossover:
+    # Sign change of (a - b) between consecutive updates, with engine.crossover
+    # rules; every event goes into an events.EventIndex as it happens
+    def __init__(self):
+        self.prev = (NAN, NAN)
+        self.events = events.EventIndex()
+
+    @property
+    def latest(self):
+        return self.events.latest_kind()
+
+    def update(self, a, b):
+        prev_a, prev_b = self.prev
+        self.prev = (a, b)
+        if a > b and prev_a <= prev_b:
+            event = 1
+        elif a < b and prev_a >= prev_b:
+            event = -1
+        else:
+            event = 0
+        self.events.push(event)
+        return event
+
+class MACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast, self.slow, self.signal = EMA(fast), EMA(slow), EMA(signal)
+        self.macd = NAN
+
+    def update(self, price):
+        self.macd = self.fast.update(price) - self.slow.update(price)
+        return self.macd, self.signal.update(self.macd)
+
+class RSI:
+    def __init__(self, n=14):
+        self.prev = NAN
+        self.gain, self.loss = RollingMean(n), RollingMean(n)
+        self.smooth = RollingMean(3)
+        self.value = NAN
+
+    def update(self, price):
+        moving = price - self.prev
+        self.prev = price
+        aver_gain = abs(self.gain.update(max(moving, 0) if not math.isnan(moving) else NAN))
+        aver_loss = abs(self.loss.update(max(-moving, 0) if not math.isnan(moving) else NAN))
+
+        if aver_loss == 0:
+            rsi = NAN if aver_gain == 0 else 100.0
+        else:
+            rsi = 100 - (100 / (1 + aver_gain/aver_loss))
+        self.value = self.smooth.update(rsi)
+        return self.value
+
+class Bollinger:
+    def __init__(self, n=20, mul=2):
+        self.mul = mul
+        self.stats = RollingMeanStd(n)
+
+    def update(self, price):
+        ma, std = self.stats.update(price)
+        return ma, ma + self.mul * std, ma - self.mul * std # ma, upper, lower
+
+class Ichimoku:
+    def __init__(self, n_1=9, n_2=26, n_3=52, n_4=26):
+        self.windows = [(RollingMax(n), RollingMin(n)) for n in (n_1, n_2, n_3)]
+        self.delay = deque(maxlen=n_4 + 1)
+        self.chikou = RollingMean(n_4)
+        self.kijun_cross, self.chikou_cross = Crossover(), Crossover()
+        self.last = None
+
+    def update(self, high, low, close):
+        tenkan, kijun, senkou_b = [(h.update(high) + l.update(low))/2 for h, l in self.windows]
+        senkou_a = (tenkan + kijun)/2
+
+        # close shifted by n_4 rows, as close.shift(n_4)
+        self.delay.append(close)
+        lagged = self.delay[0] if len(self.delay) == self.delay.maxlen else NAN
+        chikou = self.chikou.update(lagged)
+
+        self.kijun_cross.update(close, kijun)
+        self.chikou_cross.update(chikou, close)
+        self.last = dict(close=close, tenkan=tenkan, kijun=kijun,
+                         senkou_a=senkou_a, senkou_b=senkou_b, chikou=chikou)
+        return self.last
+
+    def levels(self):
+        support, resistance = [], []
+        for span in ('senkou_a', 'senkou_b'):
+            if self.last['close'] >= self.last[span]:
+                support.append(self.last[span])
+            else:
+                resistance.append(self.last[span])
+        return support, resistance
+
+class StreamingIndicators:
+
+    """
+    All four indicators for a fixed list of sources, updated one row at a time.
+    Inputs:
+        - sources = Column names that contain BTC-USD values
+        - params = engine.Params (periods)
+    Usage:
+        - update(row) with one price per source, then summary() for the
+        same outputs indicators.macd / rsi / bollinger_band / ichimoku_cloud give
+    """
+
+    def __init__(self, sources, params=None):
+        p = params or engine.Params()
+        self.sources = list(sources)
+        self.params = p
+        self.macd = [MACD(p.macd_fast, p.macd_slow, p.macd_signal) for _ in self.sources]
+        self.rsi = [RSI(p.rsi_period) for _ in self.sources]
+        self.bollinger = [Bollinger(p.bollinger_period, p.bollinger_mul) for _ in self.sources]
+        self.ichimoku = Ichimoku(p.tenkan, p.kijun, p.senkou, p.chikou)
+        self.macd_cross = [Crossover() for _ in self.sources]
+        self.macd_events = events.EventIndex() # crossovers every source agrees on
+        self.widths = deque(maxlen=engine.SQUEEZE_WINDOW)
+        self.rows = 0
+        self.last = {}
+
+    def update(self, row, hlc=None):
+        # hlc = (high, low, close) for Ichimoku when the sources have real OHLC
+        row = [float(x) for x in row]
+
+        lines = [m.update(x) for m, x in zip(self.macd, row)]
+        crossings = [c.update(macd, signal) for c, (macd, signal) in zip(self.macd_cross, lines)]
+        self.macd_events.push(int(np.trunc(np.mean(crossings))))
+
+        rsi = float(np.mean([r.update(x) for r, x in zip(self.rsi, row)]))
+        bands = np.mean([b.update(x) for b, x in zip(self.bollinger, row)], axis=0)
+        self.widths.append(abs(bands[1] - bands[2]))
+
+        self.ichimoku.update(*(hlc or (row[-1], row[0], float(np.mean(row)))))
+
+        self.rows += 1
+        self.last = dict(price=row, macd=lines, rsi=rsi, bands=bands)
+        return self
+
+    def extend(self, prices, hlc=None):
+        prices = np.asarray(prices, dtype='float64')
+        rows = zip(*[np.asarray(a, dtype='float64') for a in hlc]) if hlc is not None else [None]*len(prices)
+        for row, bar in zip(prices, rows):
+            self.update(row, bar)
+        return self
+
+    def summary(self):
+        macd = self.last['macd'][-1][0]
+        rsi = self.last['rsi']
+        ma, upper, lower = self.last['bands']
+        price = self.last['price'][0]
+
+        if abs(price - upper) <= 0.3*abs(price - ma):
+            bounce = -1
+        elif abs(price - lower) <= 0.3*abs(price - ma):
+            bounce = 1
+        else:
+            bounce = 0
+
+        width = np.diff(np.array(self.widths))
+        width = width[~np.isnan(width)]
+        squeeze = -engine._sign(width.mean()) if len(width) else 0
+
+        support, resistance = self.ichimoku.levels()
+
+        return dict(
+            macd=(engine._sign(macd), self.macd_events.latest_kind()),
+            rsi=(rules.load().rsi_zone(rsi), rsi),
+            bollinger=(bounce, squeeze),
+            ichimoku=(support, resistance, self.ichimoku.kijun_cross.latest,
+                      self.ichimoku.chikou_cross.latest))
+
+def seed(sources, prices, res, hlc=None, rows=None):
+
+    """
+    Streaming state after the first `rows` rows, taken from a batch run instead
+    of feeding the rows one by one: EMAs and crossover histories come from the
+    batch arrays, and each rolling window is filled with its last inputs only.
+    Inputs:
+        - sources = Column names that contain BTC-USD values
+        - prices = NumPy array (dates, sources) res was computed on
+        - res = engine.Indicators of prices (one asset, the mean of its sources)
+        - hlc = (high, low, close) res's Ichimoku was computed on, if real OHLC
+        - rows = rows the state has seen (all of them by default)
+    Outputs:
+        - StreamingIndicators, as extend(prices[:rows], hlc) would leave it
+    """
+
+    rows = len(prices) if rows is None else rows
+    state = StreamingIndicators(sources, res.params)
+    if rows == 0:
+        return state
+    p = state.params
+    prices = np.asarray(prices[:rows], dtype='float64')
+    last = rows - 1
+
+    m = res.macd
+    fast, slow = engine.ewm(prices, p.macd_fast)[-1], engine.ewm(prices, p.macd_slow)[-1]
+    for j, (calc, cross) in enumerate(zip(state.macd, state.macd_cross)):
+        calc.fast.value, calc.slow.value = float(fast[j]), float(slow[j])
+        calc.macd, calc.signal.value = float(m.macd[last, j]), float(m.signal[last, j])
+        cross.prev = (calc.macd, calc.signal.value)
+        cross.events = events.EventIndex(engine.crossover(m.macd[:rows, j], m.signal[:rows, j]))
+    state.macd_events = events.EventIndex(m.crossover[:rows])
+
+    for j, (r, b) in enumerate(zip(state.rsi, state.bollinger)):
+        # n + 1 prices fill the gain / loss windows, 2 more the 3-row smoothing
+        for x in prices[max(0, rows - p.rsi_period - 3):, j]:
+            r.update(x)
+        for x in prices[max(0, rows - p.bollinger_period):, j]:
+            b.update(x)
+    b = res.bollinger
+    state.widths.extend(np.abs(b.upper[:rows].mean(axis=1) - b.lower[:rows].mean(axis=1))[-engine.SQUEEZE_WINDOW:])
+
+    i = state.ichimoku
+    high, low, close = (np.asarray(a[:rows], dtype='float64') for a in (hlc or engine.high_low_close(prices)))
+    for (h, l), n in zip(i.windows, (p.tenkan, p.kijun, p.senkou)):
+        for x, y in zip(high[-n:], low[-n:]):
+            h.update(x)
+            l.update(y)
+    i.delay.extend(close[-i.delay.maxlen:])
+    for t in range(max(0, rows - p.chikou), rows):
+        i.chikou.update(close[t - p.chikou] if t >= p.chikou else NAN)
+    tenkan, kijun, senkou_b = [float(h.value + l.value)/2 for h, l in i.windows]
+    i.last = dict(close=float(close[last]), tenkan=tenkan, kijun=kijun,
+                  senkou_a=(tenkan + kijun)/2, senkou_b=senkou_b, chikou=float(i.chikou.value))
+    i.kijun_cross.prev = (i.last['close'], kijun)
+    i.kijun_cross.events = events.EventIndex(res.ichimoku.kijun_crossover[:rows])
+    i.chikou_cross.prev = (i.last['chikou'], i.last['close'])
+    i.chikou_cross.events = events.EventIndex(res.ichimoku.chikou_crossover[:rows])
+
+    bands = []
+    for calc in state.bollinger:
+        ma, std = calc.stats.value
+        bands.append((ma, ma + calc.mul * std, ma - calc.mul * std))
+    state.rows = rows
+    state.last = dict(price=[float(x) for x in prices[last]], macd=[(c.macd, c.signal.value) for c in state.macd],
+                      rsi=float(np.mean([r.value for r in state.rsi])), bands=np.mean(bands, axis=0))
+    return state
+
+def snapshot(state, path):
+    # temporary file, then rename, so a crash never leaves a torn snapshot
+    with atomic.write(path, 'wb') as f:
+        pickle.dump(state, f)
+
+def restore(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
@@ -0,0 +1,177 @@
+from code import backtest
+from code import engine
+from code import fetch
+from code import providers
+import pandas as pd
+import numpy as np
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Intraday bars, resampling and multi-timeframe scoring.
+
+Bars are bucketed on their int64 epoch time (UTC, aligned to midnight), and
+each bucket's open / high / low / close is taken with NumPy reductions over the
+sorted rows. The raw rows are read once, for the finest timeframe; every
+coarser one is built from the bars of the previous one, so 4h and 1d cost
+next to nothing after 1h. Close-only input becomes full OHLC on the way, and
+the indicators are then scored on every timeframe and combined.
+'''
+
+TIMEFRAMES = ['1h', '4h', '1d']
+
+def width(rule):
+    """Length of a timeframe in nanoseconds, e.g. width('4h')"""
+    return pd.Timedelta(rule).value
+
+def _index(bars):
+    # naive UTC DatetimeIndex, sorted
+    index = pd.DatetimeIndex(bars.index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    bars = bars.set_axis(index)
+    return bars if index.is_monotonic_increasing else bars.sort_index(kind='stable')
+
+def _runs(buckets):
+    # first row of every run of equal bucket ids
+    return np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+def _reduce(values, starts, how):
+    if how == 'first':
+        return values[starts]
+    if how == 'last':
+        return values[np.r_[starts[1:] - 1, len(values) - 1]]
+    if how == 'max':
+        return np.maximum.reduceat(values, starts)
+    return np.minimum.reduceat(values, starts)
+
+def resample_one(bars, rule):
+
+    """
+    Inputs:
+        - bars = frame indexed by time with close (and optionally open / high / low)
+        - rule = timeframe, e.g. '1h', '4h', '1d', no finer than the bars'
+        spacing (ValueError otherwise)
+    Outputs:
+        - frame indexed by bucket start time with open, high, low, close
+    """
+
+    bars = _index(bars)
+    if bars.empty:
+        return pd.DataFrame(columns=list(providers.AGG), index=pd.DatetimeIndex([]), dtype='float64')
+    # bucket in the index's own unit (pandas may keep s / ms / us), no conversion
+    unit = bars.index.unit
+    step = width(rule) // pd.Timedelta(1, unit=unit).value
+    # bars cannot be split: a finer timeframe would only relabel the input bars
+    spacing = np.diff(bars.index.asi8)
+    spacing = spacing[spacing > 0]
+    if len(spacing) and spacing.min() > step:
+        raise ValueError(f'Timeframe {rule} is finer than the input bars, which are '
+                         f'{pd.Timedelta(int(spacing.min()), unit=unit)} apart')
+    buckets = bars.index.asi8 // step
+    starts = _runs(buckets)
+    index = buckets[starts]
+
+    columns = {}
+    for c, how in providers.AGG.items():
+        # close-only input: open / high / low come from the closes
+        values = bars[c if c in bars.columns else 'close'].to_numpy(dtype='float64')
+        valid = ~np.isnan(values)
+        if valid.all():
+            columns[c] = pd.Series(_reduce(values, starts, how), index=index)
+        elif valid.any():
+            # gaps: aggregate the rows that have a value (NaN is skipped, as in pandas)
+            kept = buckets[valid]
+            runs = _runs(kept)
+            columns[c] = pd.Series(_reduce(values[valid], runs, how), index=kept[runs])
+        else:
+            columns[c] = pd.Series(np.nan, index=index)
+
+    df = pd.DataFrame(columns).reindex(index)
+    df.index = pd.DatetimeIndex((index * step).astype(f'datetime64[{unit}]'))
+    return df
+
+def resample(bars, rules=TIMEFRAMES):
+
+    """
+    Every timeframe of rules in one pass over the raw bars.
+    Outputs:
+        - dict of rule to OHLC frame (see resample_one)
+    """
+
+    rules = sorted(rules, key=width)
+    out = {}
+    previous = None
+    for rule in rules:
+        # bucket edges nest (all aligned on the epoch), so a coarser timeframe
+        # can be built from any finer one it is a multiple of
+        if previous is not None and width(rule) % width(previous) == 0:
+            out[rule] = resample_one(out[previous], rule)
+        else:
+            out[rule] = resample_one(bars, rule)
+        previous = rule
+    return out
+
+def intraday(sources=None):
+    """Configured providers that can serve intraday rows"""
+    return [p for p in (sources or providers.configured()) if hasattr(p, 'bars')]
+
+def load(sources=None, rules=TIMEFRAMES, start=fetch.START_DATE, end=None):
+
+    """
+    Resampled bars of every source that has intraday rows.
+    Inputs:
+        - sources = providers (sources.json by default); only file sources
+        (csv / parquet) carry intraday rows, others are skipped
+    Outputs:
+        - dict of rule to a frame like fetch.live_data's: a date column (bar
+        start time), a close column per source and its OHLC columns, rows
+        every source has a close for
+    """
+
+    sources = intraday(sources)
+    if not sources:
+        raise ValueError('No intraday source configured, add a csv / parquet source to sources.json')
+
+    end = end or pd.Timestamp.now('UTC').date()
+    resampled = {p.name: resample(p.bars(start, end), rules) for p in sources}
+
+    frames = {}
+    for rule in rules:
+        df = providers.merge([p.columns(resampled[p.name][rule]) for p in sources])
+        frames[rule] = fetch.complete(df, sources).reset_index()
+    return frames
+
+def score(frames, columns, params=None, weights=None):
+
+    """
+    Composite score on each timeframe, then across them.
+    Inputs:
+        - frames = dict of rule to price frame (see load())
+        - columns = Column names that contain BTC-USD values
+        - weights = optional dict of rule to weight in the combined score
+        (all timeframes count the same by default)
+    Outputs: (table, combined)
+        - table = Pandas DataFrame, one row per timeframe with its latest bar,
+        each indicator's term and the score
+        - combined = weighted mean of the timeframe scores, rounded like them
+    """
+
+    rows = []
+    for rule, df in frames.items():
+        prices = engine.matrix(df, columns)
+        res = engine.compute(prices, params, engine.hlc(df, columns))
+        terms = backtest.score_history(res, prices)
+        rows.append({'timeframe': rule, 'time': df['date'].iloc[-1], 'bars': len(df),
+                     **{t: round(float(terms[t][-1])*100, 1) for t in backtest.TERMS},
+                     'score': float(terms['score'][-1])})
+
+    table = pd.DataFrame(rows)
+    w = np.array([(weights or {}).get(r, 1.0) for r in table['timeframe']], dtype='float64')
+    combined = round(float((table['score'].to_numpy()*w).sum()/w.sum()), 1)
+    return table, combined
@@ -0,0 +1,256 @@
+from code import engine
+from code import columnar
+from code import backtest
+from code import rules
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import fields, asdict
+import pandas as pd
+import numpy as np
+import itertools
+import hashlib
+import json
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Parameter sweep over indicator periods and score weights.
+
+Grid keys are either engine.Params fields (periods) or backtest.TERMS
+(per-indicator weight; a term left out keeps its weight in code.rules). Grid
+points are handed to a process pool in sorted, contiguous chunks, and each
+worker keeps a Primitives cache, so an EMA, rolling window or indicator block
+is computed once per worker and reused by every grid point that needs the
+same periods.
+Weights are linear in the score terms, so all weight combinations for one set
+of periods share a single indicator evaluation.
+
+Each finished configuration is appended to a JSON lines checkpoint; a sweep
+started again with the same checkpoint skips what is already there. The
+checkpoint's first line is a fingerprint of what the results depend on besides
+the configuration (the prices, the window and the rules), and a checkpoint
+made on anything else is started again.
+'''
+
+CHECKPOINT_PATH = 'data/sweep.jsonl'
+RESULTS_PATH = 'data/sweep.csv'
+
+GRID = {
+    'macd_fast': [8, 12],
+    'macd_slow': [21, 26],
+    'rsi_period': [9, 14, 21],
+    'bollinger_period': [20],
+    'bollinger_mul': [2, 2.5],
+    'kijun': [22, 26],
+    'macd': [1/9, 1/6],
+    'rsi': [1/9, 1/6],
+    'bollinger': [1/9],
+    'ichimoku': [1/9],
+}
+
+PARAMS = [f.name for f in fields(engine.Params)]
+
+class Primitives:
+
+    """
+    Memoized rolling primitives and indicator blocks over one price matrix.
+    Every cache key is the tuple of periods the value depends on. hlc is the
+    (high, low, close) of engine.hlc(), for sources with real OHLC columns.
+    """
+
+    def __init__(self, prices, hlc=None):
+        self.prices = prices
+        self.hlc = hlc if hlc is not None else engine.high_low_close(prices)
+        self.cache = {}
+
+    def _memo(self, key, compute):
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def ema(self, span):
+        return self._memo(('ema', span), lambda: engine.ewm(self.prices, span))
+
+    def mean_std(self, n):
+        return self._memo(('mean_std', n), lambda: (engine.rolling_mean(self.prices, n), engine.rolling_std(self.prices, n)))
+
+    def macd(self, fast, slow, signal):
+        return self._memo(('macd', fast, slow, signal),
+                          lambda: engine.macd_from_line(self.ema(fast) - self.ema(slow), signal))
+
+    def rsi(self, n):
+        return self._memo(('rsi', n), lambda: engine.rsi(self.prices, n))
+
+    def bollinger(self, n, mul):
+        return self._memo(('bollinger', n, mul),
+                          lambda: engine.bollinger_from_stats(self.prices, *self.mean_std(n), mul))
+
+    def ichimoku(self, n_1, n_2, n_3, n_4):
+        return self._memo(('ichimoku', n_1, n_2, n_3, n_4),
+                          lambda: engine.ichimoku_cloud(*self.hlc, n_1, n_2, n_3, n_4))
+
+    def compute(self, p):
+        return engine.Indicators(
+            self.macd(p.macd_fast, p.macd_slow, p.macd_signal),
+            self.rsi(p.rsi_period),
+            self.bollinger(p.bollinger_period, p.bollinger_mul),
+            self.ichimoku(p.tenkan, p.kijun, p.senkou, p.chikou),
+            p)
+
+def primitives(path, columns):
+    """Primitives over the close (and any high / low) columns of a columnar file"""
+    cols = columnar.load(path)
+    return Primitives(cols.matrix(columns), engine.hlc(cols, columns))
+
+def ohlc(data, columns):
+    # close columns plus the high / low columns engine.hlc reads, where data has them
+    return columns + [f'{c}_{k}' for c in columns for k in ('high', 'low') if f'{c}_{k}' in data.columns]
+
+def fingerprint(data, columns, start=None, end=None, rule_set=None):
+    """What sweep results depend on besides the configuration: prices, window and rules"""
+    prices = np.ascontiguousarray(engine.matrix(data, ohlc(data, columns)))
+    dates = np.asarray(data['date'])
+    return {'rows': len(dates), 'last': str(dates[-1]) if len(dates) else None,
+            'prices': hashlib.sha1(prices.tobytes()).hexdigest(),
+            'start': None if start is None else str(start), 'end': None if end is None else str(end),
+            'rules': (rule_set or rules.load()).digest}
+
+def expand(grid):
+    """Split a grid into (list of Params, list of weight dicts), both cartesian"""
+    unknown = set(grid) - set(PARAMS) - set(backtest.TERMS)
+    if unknown:
+        raise ValueError(f'Unknown grid keys: {sorted(unknown)}')
+
+    defaults = asdict(engine.Params())
+    periods = [k for k in PARAMS if k in grid]
+    params = [engine.Params(**{**defaults, **dict(zip(periods, values))})
+              for values in itertools.product(*[grid[k] for k in periods])]
+
+    default = rules.load().weights['all']
+    weights = [dict(zip(backtest.TERMS, values))
+               for values in itertools.product(*[grid.get(k, [default.get(k, 0.0)]) for k in backtest.TERMS])]
+
+    return params, weights
+
+def key(params, weights):
+    return json.dumps({**asdict(params), **weights}, sort_keys=True)
+
+
+# Worker side: the price matrix, Primitives cache and rules live for the whole pool
+
+_prims = None
+_window = None
+_rules = None
+
+def _init(path, columns, window, spec=None):
+    # every worker maps the same file read-only instead of receiving a copy, and
+    # scores by the rules the checkpoint was fingerprinted with
+    global _prims, _window, _rules
+    _prims = primitives(path, columns)
+    _window = window
+    _rules = rules.RuleSet(spec)
+
+def _evaluate(params, weights, done=()):
+    res = _prims.compute(params)
+    units = backtest.score_history(res, _prims.prices, max_score=1, rule_set=_rules)
+    close = res.ichimoku.close[_window]
+
+    rows = []
+    for w in weights:
+        k = key(params, w)
+        if k in done:
+            continue
+        score = backtest.weigh(units, w, _window, _rules)
+        sim = backtest.simulate(close, backtest.signals(score, _rules))
+        rows.append({**asdict(params), **{f'w_{t}': w[t] for t in backtest.TERMS},
+                     **backtest.metrics(sim), 'key': k})
+    return rows
+
+def _chunk(params, weights, done, size):
+    for i in range(0, len(params), size):
+        yield [(p, weights, done) for p in params[i:i+size]]
+
+def _run_chunk(tasks):
+    return [row for task in tasks for row in _evaluate(*task)]
+
+def _read_checkpoint(path):
+    rows = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    break # torn last line from an interrupted run
+    return rows
+
+def sweep(data, columns, grid=None, start=None, end=None, workers=None,
+          checkpoint=CHECKPOINT_PATH, rank_by='total_return'):
+
+    """
+    Backtest every grid configuration and rank them.
+    Inputs:
+        - data = Pandas DataFrame with date and price columns
+        - columns = Column names that contain BTC-USD values
+        - grid = dict of parameter / weight name to list of values (GRID by default)
+        - start, end = historical window scored (indicators warm up on the rows before start)
+        - workers = size of the process pool (all cores by default)
+        - checkpoint = JSON lines file results are appended to as they finish
+        - rank_by = backtest metric to sort on, best first
+    Outputs:
+        - Pandas DataFrame, one row per configuration, ranked
+    """
+
+    grid = grid or GRID
+    if end is not None:
+        data = data[data['date'] <= pd.to_datetime(end).date()]
+    window = slice(None)
+    if start is not None:
+        window = slice(int((data['date'] < pd.to_datetime(start).date()).sum()), None)
+
+    params, weights = expand(grid)
+    params.sort(key=lambda p: tuple(asdict(p).values())) # neighbours share blocks
+
+    rule_set = rules.load()
+    header = {'fingerprint': fingerprint(data, columns, start, end, rule_set)}
+    rows = _read_checkpoint(checkpoint)
+    if rows and rows[0] != header:
+        print(f'{checkpoint} was made on other prices, window or rules, starting it again')
+        rows = []
+    done = {row['key'] for row in rows if 'key' in row}
+    todo = [p for p in params if any(key(p, w) not in done for w in weights)]
+
+    if todo:
+        directory = os.path.dirname(checkpoint)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        workers = workers or os.cpu_count()
+        size = max(1, len(todo) // (workers * 4))
+        shared = os.path.splitext(checkpoint)[0] + '.cols'
+        columnar.write(data, shared, ohlc(data, columns))
+
+        try:
+            with open(checkpoint, 'a' if rows else 'w') as f, \
+                    ProcessPoolExecutor(workers, initializer=_init,
+                                        initargs=(shared, columns, window, rule_set.spec)) as pool:
+                if not rows:
+                    f.write(json.dumps(header) + '\n')
+                    f.flush()
+                futures = [pool.submit(_run_chunk, tasks) for tasks in _chunk(todo, weights, done, size)]
+                for future in as_completed(futures):
+                    for row in future.result():
+                        f.write(json.dumps(row) + '\n')
+                    f.flush()
+        finally:
+            os.remove(shared)
+
+    wanted = {key(p, w) for p in params for w in weights}
+    table = pd.DataFrame([row for row in _read_checkpoint(checkpoint) if row.get('key') in wanted])
+    table = table.drop_duplicates('key', keep='last').drop(columns='key')
+    return table.sort_values(rank_by, ascending=False).reset_index(drop=True)
@@ -0,0 +1,185 @@
+from code import engine
+from code import columnar
+from code import backtest
+from code import rules
+from code import tuning
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+import pandas as pd
+import numpy as np
+import json
+import os
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+Walk-forward evaluation.
+
+Train / test windows slide over the stored history. In every window, each
+grid configuration (see code.tuning) is backtested on the train rows, the best
+one is picked, and it is scored on the test rows that follow, which it never
+saw. Every indicator only looks back, so the EMAs, rolling sums, max / min
+and variances are computed once over the whole series and each window is a
+slice of them; the score terms of a set of periods are kept per worker and
+shared by every window that worker evaluates. Windows run in a process pool
+that maps one columnar price file, and each finished window is appended to a
+JSON lines file straight away.
+'''
+
+RESULTS_PATH = 'data/walkforward.jsonl'
+TABLE_PATH = 'data/walkforward.csv'
+TRAIN = 730 # rows (days for daily prices)
+TEST = 90
+
+def windows(rows, train=TRAIN, test=TEST, step=None, start=0, anchored=False):
+
+    """
+    Inputs:
+        - rows = length of the history
+        - train, test = rows in each train / test window
+        - step = rows between windows (test by default: test windows tile)
+        - start = first row a train window may use (after the warm-up)
+        - anchored = train windows all begin at start and grow, instead of sliding
+    Outputs:
+        - list of (train_start, test_start, test_end) row numbers; the train
+        rows are train_start..test_start-1, the test rows test_start..test_end-1
+    """
+
+    step = step or test
+    if train < 2 or test < 2 or step < 1:
+        raise ValueError('train and test need at least 2 rows, step at least 1')
+    out = []
+    split = start + train
+    while split + test <= rows:
+        out.append((start if anchored else split - train, split, split + test))
+        split += step
+    return out
+
+def warmup(grid):
+    """Rows before the first window, so the longest indicator of the grid is defined"""
+    p = asdict(engine.Params())
+    longest = max([p['macd_slow'] + p['macd_signal'], p['bollinger_period'] + engine.SQUEEZE_WINDOW,
+                   p['senkou'] + p['kijun'], p['chikou']*2, p['rsi_period'] + 3] +
+                  [v for k, values in grid.items() if k in tuning.PARAMS for v in values])
+    return int(np.ceil(2*longest))
+
+
+# Worker side: one mapped price matrix, its Primitives and score terms per set of periods
+
+_prims = None
+_units = {}
+_grid = None
+_rules = None
+
+def _init(path, columns, params, weights, rank_by, spec=None):
+    global _prims, _grid, _rules
+    _prims = tuning.primitives(path, columns)
+    _units.clear()
+    _grid = (params, weights, rank_by)
+    _rules = rules.RuleSet(spec)
+
+def _terms(params):
+    # per-term score series over the whole history, unit weight
+    k = tuple(asdict(params).values())
+    if k not in _units:
+        res = _prims.compute(params)
+        _units[k] = (backtest.score_history(res, _prims.prices, max_score=1, rule_set=_rules), res.ichimoku.close)
+    return _units[k]
+
+def _backtest(units, close, w, rows):
+    score = backtest.weigh(units, w, rows, _rules)
+    return backtest.metrics(backtest.simulate(close[rows], backtest.signals(score, _rules)))
+
+def _evaluate(number, bounds):
+    params, weights, rank_by = _grid
+    train, test = slice(bounds[0], bounds[1]), slice(bounds[1], bounds[2])
+
+    best, best_value = None, -np.inf
+    for p in params:
+        units, close = _terms(p)
+        for w in weights:
+            value = _backtest(units, close, w, train)[rank_by]
+            if value > best_value or best is None:
+                best, best_value = (p, w), value
+
+    p, w = best
+    units, close = _terms(p)
+    baseline_units, baseline_close = _terms(engine.Params())
+    return {'window': number, 'train_start': bounds[0], 'test_start': bounds[1], 'test_end': bounds[2],
+            **asdict(p), **{f'w_{t}': w[t] for t in backtest.TERMS},
+            f'train_{rank_by}': float(best_value),
+            **_backtest(units, close, w, test),
+            'default_return': _backtest(baseline_units, baseline_close, _rules.weights['all'], test)['total_return']}
+
+def run(data, columns, grid=None, train=TRAIN, test=TEST, step=None, anchored=False,
+        workers=None, path=RESULTS_PATH, rank_by='total_return'):
+
+    """
+    Walk forward over the history.
+    Inputs:
+        - data = Pandas DataFrame with date and price columns, or a
+        columnar.Columns (its file is then mapped by the workers as it is)
+        - columns = Column names that contain BTC-USD values
+        - grid = dict of parameter / weight name to list of values (tuning.GRID by default)
+        - train, test, step, anchored = window layout, see windows()
+        - workers = size of the process pool (all cores by default)
+        - path = JSON lines file every window is appended to as it finishes
+        (replaced at the start of a run)
+        - rank_by = backtest metric the train windows are ranked on
+    Outputs:
+        - Pandas DataFrame, one row per window in order: its dates, the chosen
+        periods and weights, the train score, the test backtest metrics and
+        the test return of the default configuration
+    """
+
+    grid = grid or tuning.GRID
+    params, weights = tuning.expand(grid)
+    params.sort(key=lambda p: tuple(asdict(p).values()))
+    dates = np.asarray(data['date'])
+    bounds = windows(len(dates), train, test, step, warmup(grid), anchored)
+    if not bounds:
+        raise ValueError(f'{len(dates)} rows are too few for a {train} + {test} row window after warm-up')
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    shared = getattr(data, 'path', None)
+    if shared is None:
+        shared = os.path.splitext(path)[0] + '.cols'
+        columnar.write(data, shared, tuning.ohlc(data, columns))
+
+    rows = []
+    try:
+        with open(path, 'w') as f, ProcessPoolExecutor(workers or os.cpu_count(), initializer=_init,
+                                                       initargs=(shared, columns, params, weights, rank_by,
+                                                                 rules.load().spec)) as pool:
+            futures = [pool.submit(_evaluate, i, b) for i, b in enumerate(bounds)]
+            for future in as_completed(futures):
+                row = future.result()
+                for k in ('train_start', 'test_start'):
+                    row[k] = str(pd.Timestamp(dates[row[k]]).date())
+                row['test_end'] = str(pd.Timestamp(dates[row['test_end'] - 1]).date())
+                f.write(json.dumps(row) + '\n')
+                f.flush()
+                rows.append(row)
+    finally:
+        if shared != getattr(data, 'path', None):
+            os.remove(shared)
+
+    return pd.DataFrame(rows).sort_values('window').reset_index(drop=True)
+
+def summary(table):
+    """
+    Out-of-sample totals: the returns of the chosen configurations compounded
+    over the test windows (meaningful when they tile, step = test), next to
+    the default configuration and buy and hold over the same windows.
+    """
+    compound = lambda r: float(np.prod(1 + table[r].to_numpy()) - 1)
+    return {'windows': len(table), 'walk_forward': compound('total_return'),
+            'default': compound('default_return'), 'buy_and_hold': compound('buy_and_hold'),
+            'beat_default': float((table['total_return'] > table['default_return']).mean())}
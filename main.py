@@ -1,4 +1,4 @@
-from code import output
+from code import profiling
 import argparse
 
 __author__ = 'Duy Cao'
@@ -9,18 +9,54 @@ __url__ = 'https://github.com/caominhduy/bitcoin-indicated'
 __version__ = '1.0'
 
 def main(args):
+    path = args.profile or profiling.requested()
+    if path:
+        profiling.start(path, args.profile_dump)
+    try:
+        run(args)
+    finally:
+        if path:
+            print(f'Profile written to {profiling.finish()}')
+
+AGGREGATIONS = ['mean', 'median', 'weighted'] # engine.AGGREGATIONS, without importing NumPy for --help
+
+def run(args):
+    # Modules are imported by the options that need them: --help and argument
+    # errors never load NumPy / Pandas, offline runs never load aiohttp, and
+    # matplotlib is only loaded to render charts
+    from code import output
     if args.all:
-        output.indicator('all')
+        output.indicator('all', args.offline, not args.no_charts, args.aggregate, args.diagnostics)
     if args.web:
-        output.indicator('web')
+        output.indicator('web', args.offline, not args.no_charts, args.aggregate, args.diagnostics)
     if args.bollinger:
-        output.indicator('bollinger')
+        output.indicator('bollinger', args.offline, not args.no_charts)
     if args.MACD:
-        output.indicator('macd')
+        output.indicator('macd', args.offline, not args.no_charts)
     if args.RSI:
-        output.indicator('rsi')
+        output.indicator('rsi', args.offline, not args.no_charts)
     if args.ichimoku:
-        output.indicator('ichimoku')
+        output.indicator('ichimoku', args.offline, not args.no_charts)
+    if args.backtest:
+        output.indicator('backtest', args.offline)
+    if args.symbols or args.watchlist:
+        symbols = args.symbols or []
+        if args.watchlist:
+            with open(args.watchlist) as f:
+                symbols += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        output.batch(symbols, args.offline)
+    if args.serve:
+        from code import daemon
+        daemon.serve(args.interval, args.offline, not args.no_charts)
+    if args.api:
+        from code import api
+        api.serve(port=args.port)
+    if args.timeframes is not None:
+        output.multi_timeframe(args.timeframes)
+    if args.sweep:
+        output.sweep(args.offline, args.grid)
+    if args.walk_forward:
+        output.walk_forward(args.offline, args.grid, args.train, args.test, args.anchored)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Bitcoin All-in-one Indicator\n',\
@@ -30,6 +66,28 @@ if __name__ == '__main__':
     parser.add_argument('--ichimoku', action='store_true', help='Use Ichimoku Cloud only')
     parser.add_argument('--MACD', action='store_true', help='Use Moving Average Convergent/Divergence only')
     parser.add_argument('--RSI', action='store_true', help='Use Relative Strength Index')
+    parser.add_argument('--backtest', action='store_true', help='Backtest the all-in-one score over the full history')
+    parser.add_argument('--aggregate', choices=AGGREGATIONS, default='mean',
+                        help='How sources are combined: mean (default), median, or weighted by reliability / sources.json weights')
+    parser.add_argument('--diagnostics', action='store_true', help='With --all, also print and save (data/sources.csv) per source readings')
+    parser.add_argument('--symbols', nargs='+', metavar='SYMBOL', help='Score several assets at once, e.g. --symbols BTC ETH LTC')
+    parser.add_argument('--watchlist', metavar='FILE', help='Score every symbol listed in FILE (one per line)')
+    parser.add_argument('--timeframes', nargs='*', metavar='TF', help='Score intraday sources on several timeframes, 1h 4h 1d by default')
+    parser.add_argument('--sweep', action='store_true', help='Grid search indicator periods and weights by backtest')
+    parser.add_argument('--grid', metavar='FILE', help='JSON grid for --sweep / --walk-forward, e.g. {"rsi_period": [9, 14, 21]}')
+    parser.add_argument('--walk-forward', action='store_true', help='Tune on sliding train windows, score on the unseen test window after each')
+    parser.add_argument('--train', type=int, metavar='ROWS', help='Rows in each --walk-forward train window (730 by default)')
+    parser.add_argument('--test', type=int, metavar='ROWS', help='Rows in each --walk-forward test window (90 by default)')
+    parser.add_argument('--anchored', action='store_true', help='With --walk-forward, grow train windows from the start instead of sliding them')
+    parser.add_argument('--serve', action='store_true', help='Keep running and refresh the all-in-one score on an interval')
+    parser.add_argument('--interval', type=int, default=3600, metavar='SECONDS', help='Seconds between refreshes with --serve (3600 by default)')
+    parser.add_argument('--api', action='store_true', help='Serve scores as JSON over HTTP on localhost')
+    parser.add_argument('--port', type=int, default=8765, help='Port for --api (8765 by default)')
+    parser.add_argument('--profile', nargs='?', const=profiling.PROFILE_PATH, metavar='FILE',
+                        help='Time every stage; JSON lines, or Prometheus text for a .prom FILE (data/profile.jsonl by default)')
+    parser.add_argument('--profile-dump', action='store_true', help='With --profile, also save cProfile and tracemalloc dumps')
+    parser.add_argument('--offline', action='store_true', help='Use the local price store only, do not download')
+    parser.add_argument('--no-charts', action='store_true', help='Score only, do not render charts')
     parser.add_argument('-w', '--web', action='store_true', help=argparse.SUPPRESS)
     args = parser.parse_args()
     main(args)
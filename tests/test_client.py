@@ -0,0 +1,136 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import unittest
+import threading
+import tempfile
+import asyncio
+import json
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code import client
+import aiohttp
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+code.client against a local stub HTTP server: timeouts, retries and the
+circuit breaker (python -m unittest discover tests).
+'''
+
+class Stub(BaseHTTPRequestHandler):
+
+    # path -> list of answers, one per hit: a status code, or 'slow' to sleep past the timeout
+    script = {}
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        Stub.hits[self.path] = Stub.hits.get(self.path, 0) + 1
+        answers = Stub.script.get(self.path, [200])
+        answer = answers[min(Stub.hits[self.path], len(answers)) - 1]
+        if answer == 'slow':
+            time.sleep(0.5)
+            answer = 200
+        body = json.dumps({'ok': True}).encode()
+        self.send_response(answer)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class ClientTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        Stub.script, Stub.hits = {}, {}
+        client.BREAKERS.clear()
+        self.state = os.path.join(tempfile.mkdtemp(), 'breakers.json')
+
+    def fetch(self, path, **request):
+        request = {'url': self.base + path, 'timeout': 0.2, 'backoff': 0.01, **request}
+        return client.fetch_all({'stub': request}, breakers=self.state)['stub']
+
+    def test_ok(self):
+        self.assertEqual(self.fetch('/ok'), {'ok': True})
+        self.assertEqual(Stub.hits['/ok'], 1)
+
+    def test_timeout_is_retried(self):
+        Stub.script['/slow'] = ['slow', 200]
+        self.assertEqual(self.fetch('/slow'), {'ok': True})
+        self.assertEqual(Stub.hits['/slow'], 2)
+
+    def test_timeout_gives_up(self):
+        Stub.script['/slow'] = ['slow']
+        self.assertIsInstance(self.fetch('/slow', retries=2), asyncio.TimeoutError)
+        self.assertEqual(Stub.hits['/slow'], 3)
+
+    def test_server_error_is_retried(self):
+        Stub.script['/flaky'] = [503, 500, 200]
+        self.assertEqual(self.fetch('/flaky'), {'ok': True})
+        self.assertEqual(Stub.hits['/flaky'], 3)
+
+    def test_client_error_is_not_retried(self):
+        Stub.script['/missing'] = [404]
+        result = self.fetch('/missing')
+        self.assertIsInstance(result, aiohttp.ClientResponseError)
+        self.assertEqual(result.status, 404)
+        self.assertEqual(Stub.hits['/missing'], 1)
+
+    def test_connection_error(self):
+        result = client.fetch_all({'stub': {'url': 'http://127.0.0.1:1/', 'retries': 1, 'backoff': 0.01}},
+                                  breakers=self.state)['stub']
+        self.assertIsInstance(result, aiohttp.ClientConnectionError)
+
+    def test_breaker_opens_and_persists(self):
+        Stub.script['/down'] = [503]
+        for _ in range(3):
+            self.assertIsInstance(self.fetch('/down', retries=0), aiohttp.ClientResponseError)
+        self.assertIsInstance(self.fetch('/down', retries=0), client.CircuitOpen)
+        self.assertEqual(Stub.hits['/down'], 3)
+
+        # a later run (a new process) starts from the saved state
+        client.BREAKERS.clear()
+        self.assertIsInstance(self.fetch('/down', retries=0), client.CircuitOpen)
+        self.assertEqual(Stub.hits['/down'], 3)
+
+    def test_breaker_trial_closes(self):
+        Stub.script['/back'] = [503, 503, 503, 503, 200]
+        for _ in range(3):
+            self.fetch('/back', retries=0)
+        # once reset_after has passed, one trial request goes out, without retries
+        with open(self.state) as f:
+            state = json.load(f)
+        state['stub']['opened'] -= client.breaker('stub').reset_after
+        with open(self.state, 'w') as f:
+            json.dump(state, f)
+        self.assertIsInstance(self.fetch('/back'), aiohttp.ClientResponseError)
+        self.assertEqual(Stub.hits['/back'], 4)
+        self.assertIsInstance(self.fetch('/back'), client.CircuitOpen)
+
+        client.breaker('stub').opened -= client.breaker('stub').reset_after
+        client.save_breakers(self.state)
+        self.assertEqual(self.fetch('/back'), {'ok': True})
+        self.assertIsNone(client.breaker('stub').opened)
+        self.assertEqual(client.breaker('stub').count, 0)
+
+if __name__ == '__main__':
+    unittest.main()
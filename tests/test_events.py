@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code import api
+from code import engine
+from code import events
+from code import rules
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+code.events.EventIndex against a plain scan of the event series.
+'''
+
+def scan_latest(series, t):
+    rows = np.flatnonzero(series[:t+1])
+    return (int(rows[-1]), int(series[rows[-1]])) if len(rows) else None
+
+def scan_since(series, t, kind=None):
+    tail = series[t:]
+    return int((tail != 0).sum() if kind is None else (tail == kind).sum())
+
+class EventIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.series = rng.choice([-1, 0, 0, 0, 1], size=300)
+        self.index = events.EventIndex(self.series)
+
+    def test_latest(self):
+        n = len(self.series)
+        self.assertEqual(self.index.latest(), scan_latest(self.series, n - 1))
+        for t in range(-n, n):
+            self.assertEqual(self.index.latest(t), scan_latest(self.series, t % n))
+            expected = scan_latest(self.series, t % n)
+            self.assertEqual(self.index.latest_kind(t), expected[1] if expected else 0)
+
+    def test_count_since(self):
+        n = len(self.series)
+        for t in range(-n, n):
+            for kind in (None, 1, -1):
+                self.assertEqual(self.index.count_since(t, kind), scan_since(self.series, t % n, kind))
+
+    def test_count_since_last_rows(self):
+        # t = -5 is the last five rows, not every event
+        series = np.zeros(40, dtype='int')
+        series[::2] = 1
+        index = events.EventIndex(series)
+        self.assertEqual(len(index), 20)
+        self.assertEqual(index.count_since(-5), 2) # rows 36 and 38
+
+    def test_latest_at(self):
+        kinds = self.index.latest_at()
+        expected = pd.Series(np.where(self.series != 0, self.series, np.nan)).ffill().fillna(0).astype('int')
+        np.testing.assert_array_equal(kinds, expected.to_numpy())
+
+    def test_append_and_push(self):
+        chunks = events.EventIndex()
+        for part in np.array_split(self.series, 7):
+            chunks.append(part)
+        pushed = events.EventIndex()
+        for x in self.series:
+            pushed.push(int(x))
+        for other in (chunks, pushed):
+            np.testing.assert_array_equal(other.positions, self.index.positions)
+            np.testing.assert_array_equal(other.kinds, self.index.kinds)
+            self.assertEqual(other.count_since(-50, 1), self.index.count_since(-50, 1))
+
+class TouchesTest(unittest.TestCase):
+
+    def test_api_touches(self):
+        rng = np.random.default_rng(3)
+        p = 30000*np.exp(np.cumsum(rng.normal(0, 0.03, 400)))
+        data = pd.DataFrame({'date': pd.date_range('2020-01-01', periods=len(p)).date,
+                             'coindesk': p, 'nomics': p*(1 + rng.normal(0, 0.002, len(p)))})
+        columns = ['coindesk', 'nomics']
+        params = engine.Params()
+        rule_set = rules.RuleSet()
+        body = api.evaluate(data, columns, params, rule_set.weights['all'], rule_set)
+
+        b = engine.compute(engine.matrix(data, columns), params).bollinger
+        price, upper, lower = data['coindesk'].to_numpy(), b.upper.mean(axis=1), b.lower.mean(axis=1)
+        above, below = price > upper, price < lower
+        last = slice(-params.bollinger_period, None)
+        expected = {'lower': int((below & ~np.r_[False, below[:-1]])[last].sum()),
+                    'upper': int((above & ~np.r_[False, above[:-1]])[last].sum())}
+        self.assertEqual(body['components']['bollinger']['touches'], expected)
+
+if __name__ == '__main__':
+    unittest.main()
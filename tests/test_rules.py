@@ -0,0 +1,107 @@
+import numpy as np
+import tempfile
+import unittest
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code import rules
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+code.rules: what expressions are refused, what they compute, and when a rule
+set counts as changed.
+'''
+
+class ExpressionTest(unittest.TestCase):
+
+    def test_rejected(self):
+        names = set(rules.INPUTS)
+        for text in ['rsi.__class__', "__import__('os')", "open('rules.json')", 'rsi[0]',
+                     'lambda: 1', "'70'", 'True', 'clip(rsi, a_min=0)', 'price > 1',
+                     '[rsi]', 'rsi if', '(x := 1)']:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    rules.Expression(text, names)
+
+    def test_vectorized(self):
+        rsi = np.array([20, 50, 80])
+        e = rules.Expression('30 < rsi < 70', {'rsi'})
+        np.testing.assert_array_equal(e(rsi=rsi), [0, 1, 0])
+        e = rules.Expression('1 if rsi > 70 else -1 if rsi < 30 else 0', {'rsi'})
+        np.testing.assert_array_equal(e(rsi=rsi), [-1, 0, 1])
+        e = rules.Expression('not (rsi > 30 and rsi < 70) or rsi == 50', {'rsi'})
+        np.testing.assert_array_equal(e(rsi=rsi), [1, 1, 1])
+        self.assertEqual(e.names, {'rsi'})
+
+class RuleSetTest(unittest.TestCase):
+
+    def test_rejected(self):
+        for spec in [{'scores': {}},
+                     {'terms': {'volume': 'rsi'}},
+                     {'terms': {'rsi': 'rsi > limit'}},
+                     {'constants': {'rsi': 50}},
+                     {'weights': {'all': {'volume': 1}}},
+                     {'weights': {'all': {'rsi': 'rsi/9'}}},
+                     {'quotes': [{'below': 10, 'quote': 'a'}, {'below': 0, 'quote': 'b'}, {'quote': 'c'}]},
+                     {'quotes': [{'below': 10, 'quote': 'a'}]},
+                     {'signals': {'buy_below': 'oversold'}}]:
+            with self.subTest(spec=spec):
+                with self.assertRaises(ValueError):
+                    rules.RuleSet(spec)
+
+    def test_constant_expressions(self):
+        # weights, constants, quote bounds and signals all take "1/2"-style text
+        r = rules.RuleSet({'constants': {'overbought': '140/2'},
+                           'weights': {'all': {'rsi': '1/6'}},
+                           'quotes': [{'below': '-1/2', 'quote': 'BUY'}, {'quote': 'SELL'}],
+                           'signals': {'buy_below': '-80/2', 'sell_from': '1/2'}})
+        self.assertEqual(r.constants['overbought'], 70)
+        self.assertEqual(r.weights['all']['rsi'], 1/6)
+        self.assertEqual(r.quote(-1), 'BUY')
+        self.assertEqual(r.quote(0), 'SELL')
+        self.assertEqual((r.buy_below, r.sell_from), (-40, 0.5))
+
+    def test_terms(self):
+        # the default rules score as the original process_* functions did
+        values = {'macd_trend': 1, 'macd_crossover': -1, 'rsi': np.array([75, 45]), 'bounce': 1, 'squeeze': 1,
+                  'kijun_trend': 1, 'chikou_trend': -1, 'support': 2, 'resistance': 0}
+        out = rules.RuleSet().terms(values)
+        np.testing.assert_allclose(out['rsi'], [2/9, 0]) # 1.5 overbought + 0.5 above the midline
+        self.assertAlmostEqual(float(out['bollinger']), -2/9)
+        np.testing.assert_array_equal(out['score'], [11.1, -11.1])
+        np.testing.assert_array_equal(rules.RuleSet().rsi_zone(np.array([75, 45, 25])), [1, 0, -1])
+
+class DigestTest(unittest.TestCase):
+
+    def test_digest(self):
+        self.assertEqual(rules.RuleSet().digest, rules.RuleSet({}).digest)
+        self.assertEqual(rules.RuleSet({'constants': {'overbought': 70}}).digest, rules.RuleSet().digest)
+        self.assertNotEqual(rules.RuleSet({'constants': {'overbought': 75}}).digest, rules.RuleSet().digest)
+        self.assertNotEqual(rules.RuleSet({'terms': {'rsi': 'rsi > overbought'}}).digest, rules.RuleSet().digest)
+
+    def test_load_follows_the_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'rules.json')
+        with open(path, 'w') as f:
+            json.dump({'constants': {'overbought': 75}}, f)
+        first = rules.load(path)
+        self.assertIs(rules.load(path), first)
+
+        with open(path, 'w') as f:
+            json.dump({'constants': {'overbought': 80}}, f)
+        stamp = os.path.getmtime(path) + 1
+        os.utime(path, (stamp, stamp))
+        second = rules.load(path)
+        self.assertEqual(second.constants['overbought'], 80)
+        self.assertNotEqual(second.digest, first.digest)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import numpy as np
+import tempfile
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code import engine
+from code import streaming
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+code.streaming against a batch run of code.engine: fed row by row, restored
+from a snapshot, or seeded from the batch arrays, a stream ends on the same
+readings.
+'''
+
+def prices(rows=500, seed=0):
+    rng = np.random.default_rng(seed)
+    p = 30000*np.exp(np.cumsum(rng.normal(0, 0.03, rows)))
+    return np.column_stack([p, p*(1 + rng.normal(0, 0.003, rows))])
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prices = prices()
+        self.res = engine.compute(self.prices)
+
+    def assertMatchesBatch(self, state):
+        r = self.res
+        s = state.summary()
+        self.assertEqual(s['macd'], (r.macd.uptrend, r.macd.latest_crossover))
+        self.assertAlmostEqual(s['rsi'][1], r.rsi.latest, places=6)
+        self.assertEqual(s['bollinger'], (r.bollinger.bounce, r.bollinger.squeeze))
+        self.assertEqual(s['ichimoku'][2:], (r.ichimoku.kijun_trend, r.ichimoku.chikou_trend))
+        np.testing.assert_allclose(s['ichimoku'][0] + s['ichimoku'][1], r.ichimoku.support + r.ichimoku.resistance)
+        np.testing.assert_allclose([m for m, _ in state.last['macd']], r.macd.macd[-1], rtol=1e-9)
+        np.testing.assert_allclose(state.last['bands'], [r.bollinger.ma[-1].mean(), r.bollinger.upper[-1].mean(),
+                                                         r.bollinger.lower[-1].mean()], rtol=1e-9)
+        self.assertEqual(state.macd_events.count, r.macd.events.count)
+
+    def test_extend(self):
+        self.assertMatchesBatch(streaming.StreamingIndicators(['a', 'b']).extend(self.prices))
+
+    def test_snapshot(self):
+        state = streaming.StreamingIndicators(['a', 'b']).extend(self.prices[:300])
+        path = os.path.join(tempfile.mkdtemp(), 'state.pkl')
+        streaming.snapshot(state, path)
+        self.assertMatchesBatch(streaming.restore(path).extend(self.prices[300:]))
+
+    def test_seed(self):
+        # seeded from a batch run of the first rows, then fed the rest
+        head = self.prices[:300]
+        state = streaming.seed(['a', 'b'], head, engine.compute(head))
+        self.assertMatchesBatch(state.extend(self.prices[300:]))
+        self.assertMatchesBatch(streaming.seed(['a', 'b'], self.prices, self.res))
+
+class GapTest(unittest.TestCase):
+
+    def test_rolling_mean_std_recovers(self):
+        # a missing quote blanks the windows it falls into, and only those
+        x = prices(120)[:, 0]
+        x[[30, 31, 70]] = np.nan
+        stats = streaming.RollingMeanStd(20)
+        got = np.array([stats.update(v) for v in x])
+        np.testing.assert_allclose(got[:, 0], engine.rolling_mean(x, 20), rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(got[:, 1], engine.rolling_std(x, 20), rtol=1e-6, equal_nan=True)
+        self.assertFalse(np.isnan(got[-1]).any())
+
+    def test_bollinger_gap(self):
+        x = prices(120)
+        x[50, 0] = np.nan
+        bands = [streaming.Bollinger(20, 2) for _ in range(2)]
+        got = np.array([[b.update(v) for b, v in zip(bands, row)] for row in x]) # (rows, sources, 3)
+        batch = engine.bollinger_band(x, 20, 2)
+        np.testing.assert_allclose(got[:, :, 1], batch.upper, rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(got[:, :, 2], batch.lower, rtol=1e-9, equal_nan=True)
+
+if __name__ == '__main__':
+    unittest.main()
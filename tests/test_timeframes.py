@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code import providers
+from code import timeframes
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+code.timeframes.resample_one against pandas' resample.
+'''
+
+def hourly(rows=500):
+    rng = np.random.default_rng(2)
+    close = 7000*np.exp(np.cumsum(rng.normal(0, 1e-2, rows)))
+    index = pd.date_range('2020-01-01', periods=rows, freq='1h')
+    bars = pd.DataFrame({'open': close, 'high': close*1.01, 'low': close*0.99, 'close': close}, index=index)
+    return bars.drop(index[100:130]) # a gap
+
+class ResampleTest(unittest.TestCase):
+
+    def test_matches_pandas(self):
+        bars = hourly()
+        for rule in ('1h', '4h', '1d'):
+            with self.subTest(rule=rule):
+                expected = bars.resample(rule).agg(providers.AGG).dropna(how='all')
+                got = timeframes.resample_one(bars, rule)
+                pd.testing.assert_frame_equal(got[list(providers.AGG)], expected[list(providers.AGG)], check_freq=False)
+
+    def test_finer_than_the_bars(self):
+        with self.assertRaises(ValueError):
+            timeframes.resample_one(hourly(), '15min')
+        with self.assertRaises(ValueError):
+            timeframes.resample(hourly(), ['15min', '1h'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import tempfile
+import unittest
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code import backtest
+from code import rules
+from code import tuning
+from code import walkforward
+
+__author__ = 'Duy Cao'
+__copyright__ = 'Duy Cao, 2020'
+__license__ = 'MIT'
+__status__ = 'release'
+__url__ = 'https://github.com/caominhduy/bitcoin-indicated'
+__version__ = '1.0'
+
+'''
+The sweep and the walk-forward score through the same rules as --backtest,
+a rules.json included.
+'''
+
+COLUMNS = ['coindesk', 'nomics']
+
+class RulesTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        p = 30000*np.exp(np.cumsum(rng.normal(0, 0.03, 900)))
+        self.data = pd.DataFrame({'date': pd.date_range('2018-01-01', periods=len(p)).date,
+                                  'coindesk': p, 'nomics': p*(1 + rng.normal(0, 0.003, len(p)))})
+        self.cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def sweep(self):
+        default = rules.load().weights['all']
+        grid = {t: [default[t]] for t in backtest.TERMS} # the default configuration only
+        return tuning.sweep(self.data, COLUMNS, grid, workers=1, checkpoint='sweep.jsonl').iloc[0]
+
+    def test_sweep_follows_the_rules(self):
+        _, report = backtest.run(self.data, COLUMNS)
+        self.assertAlmostEqual(self.sweep()['total_return'], report['total_return'])
+
+        with open('rules.json', 'w') as f:
+            json.dump({'terms': {'rsi': '3*(rsi >= midline) - 1.5', 'macd': '2*macd_trend'},
+                       'constants': {'midline': 55}, 'weights': {'all': {'rsi': '1/4'}},
+                       'signals': {'buy_below': -20, 'sell_from': 20}}, f)
+        _, custom = backtest.run(self.data, COLUMNS)
+        self.assertNotAlmostEqual(custom['total_return'], report['total_return'])
+        self.assertAlmostEqual(self.sweep()['total_return'], custom['total_return'])
+
+    def test_walk_forward_follows_the_rules(self):
+        with open('rules.json', 'w') as f:
+            json.dump({'terms': {'rsi': '3*(rsi >= midline) - 1.5'}, 'signals': {'buy_below': -20, 'sell_from': 20}}, f)
+        grid = {'rsi': [1/9]}
+        table = walkforward.run(self.data, COLUMNS, grid, train=300, test=100, workers=1, path='wf.jsonl')
+        start = walkforward.warmup(grid)
+        _, test_start, test_end = walkforward.windows(len(self.data), 300, 100, start=start)[0]
+
+        # the default configuration's test window, cut out of a plain backtest
+        history, _ = backtest.run(self.data.iloc[:test_end], COLUMNS)
+        close = history['close'].to_numpy()[test_start:test_end]
+        signal = backtest.signals(history['score'].to_numpy()[test_start:test_end])
+        expected = backtest.metrics(backtest.simulate(close, signal))['total_return']
+        self.assertAlmostEqual(table['default_return'][0], expected)
+
+if __name__ == '__main__':
+    unittest.main()